@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+""" Benchmark suite for parse, eval, optimize and generate hot paths
+
+Usage:
+    python benchmarks/bench_microlisp.py [--sizes 10,30,60] [--rows 200]
+        [--label NAME] [--output result.json] [--compare baseline.json]
+
+Every case is timed on synthetic `and'/`or'/`not'/`eq' trees of three shapes
+(wide, deep, random) and a synthetic dataset. With --output results are saved
+as JSON, --compare prints time ratios against a previously saved file.
+Only functions available in older releases are used, so the same script
+can be run against every version.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from microlisp.microlisp import microlisp_compile, microlisp_dumps, microlisp_eval, microlisp_is_expression
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, special_optimize, shrink_all, tree_generator
+
+COLUMNS = 8
+VALUES = 10
+
+def random_eq(rnd):
+    """ (eq (env Ak) vX vY ...) """
+    return ["eq", ["env", "A%d" % rnd.randrange(COLUMNS)]] + \
+        ["v%d" % rnd.randrange(VALUES) for i in range(rnd.randint(1, 3))]
+
+def wide_tree(size, rnd):
+    """ (or (eq ...) (eq ...) ...) with `size' children """
+    return ["or"] + [random_eq(rnd) for i in range(size)]
+
+def deep_tree(size, rnd):
+    """ (or (eq ...) x4 (and (eq ...) x4 (or ...))) with about `size' `eq' leaves """
+    expr = random_eq(rnd)
+    for i in range(max(1, (size - 1) // 4)):
+        expr = ["and" if i % 2 else "or"] + [random_eq(rnd) for j in range(4)] + [expr]
+    return expr
+
+def random_tree(size, rnd):
+    """ Random tree of `and', `or', `not', `eq' with about `size' `eq' leaves """
+    if size <= 1:
+        return random_eq(rnd)
+    if rnd.random() < 0.1:
+        return ["not", random_tree(size - 1, rnd)]
+    parts = rnd.randint(2, min(4, size))
+    cuts = sorted(rnd.sample(range(1, size), parts - 1))
+    sizes = [b - a for a, b in zip([0] + cuts, cuts + [size])]
+    return [rnd.choice(["and", "or"])] + [random_tree(s, rnd) for s in sizes]
+
+SHAPES = [("wide", wide_tree), ("deep", deep_tree), ("random", random_tree)]
+
+def random_dataset(rows, rnd):
+    return [{"A%d" % c: "v%d" % rnd.randrange(VALUES) for c in range(COLUMNS)} for r in range(rows)]
+
+def stop_at_eq(expr, elem):
+    return microlisp_is_expression(expr) and expr[0] in ("eq", "not")
+
+def allow_all(expr, elem):
+    return (True, True)
+
+def measure(func, min_time=0.2, repeat=3):
+    """ Best time of one call in seconds """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if number == 1 and elapsed >= min_time:
+            return elapsed # slow case, one call is enough
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed
+    for r in range(repeat - 1):
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+def cases(expr, dataset, rnd):
+    funcs = SPECIAL_LISP_FUNC
+    txt = microlisp_dumps(expr)
+    elem = random_eq(rnd)
+    yield "compile", lambda: microlisp_compile(txt)
+    yield "eval", lambda: [microlisp_eval(funcs, env, expr) for env in dataset]
+    yield "optimize", lambda: special_optimize(funcs, expr)
+    yield "shrink_all", lambda: shrink_all(expr)
+    yield "generate", lambda: list(tree_generator(funcs, expr, elem, allow_all, stop_at_eq))
+
+def run(sizes, rows, seed=1):
+    results = []
+    for shape, make in SHAPES:
+        for size in sizes:
+            rnd = random.Random(seed)
+            expr = make(size, rnd)
+            dataset = random_dataset(rows, rnd)
+            for case, func in cases(expr, dataset, rnd):
+                seconds = measure(func)
+                results.append({"case": case, "shape": shape, "size": size, "seconds": seconds})
+                print("%-10s %-7s %6d %12.6f" % (case, shape, size, seconds))
+                sys.stdout.flush()
+    return results
+
+def compare(results, baseline):
+    base = {(r["case"], r["shape"], r["size"]): r["seconds"] for r in baseline["results"]}
+    print("\n%-10s %-7s %6s %12s %12s %8s" % ("case", "shape", "size", "baseline, s", "current, s", "ratio"))
+    for r in results:
+        old = base.get((r["case"], r["shape"], r["size"]))
+        if old is None: continue
+        print("%-10s %-7s %6d %12.6f %12.6f %8.2f" % (r["case"], r["shape"], r["size"], old, r["seconds"], r["seconds"] / old))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="microlisp benchmark suite")
+    parser.add_argument("--sizes", default="10,30,60", help="comma separated tree sizes")
+    parser.add_argument("--rows", type=int, default=200, help="dataset rows for `eval'")
+    parser.add_argument("--label", default="", help="label stored in output, e.g. version")
+    parser.add_argument("--output", help="save results to JSON file")
+    parser.add_argument("--compare", help="JSON file of previous run to compare with")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = run(sizes, args.rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"label": args.label, "python": platform.python_version(),
+                       "sizes": sizes, "rows": args.rows, "results": results}, fh, indent=1)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            compare(results, json.load(fh))
+
+if __name__ == "__main__":
+    main()
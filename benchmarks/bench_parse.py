@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+""" Parser scaling benchmark: microlisp_compile against the previous
+re.split + list.pop(0) recursive parser
+
+Usage: python benchmarks/bench_parse.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from microlisp.microlisp import microlisp_compile, microlisp_is_atom, microlisp_decode_atom
+
+def legacy_parse(tokens):
+    """ Previous implementation of microlisp_parse (typ='list') """
+    if len(tokens)==0:
+        raise SyntaxError("microlisp_parse: empty tokens list")
+    if tokens[0]=="(":
+        res = []
+        tokens.pop(0)
+        op = tokens.pop(0)
+        if not microlisp_is_atom(op):
+            raise SyntaxError("microlisp_parse: invalid atom `%s'" % (op,))
+        res.append( op )
+        while tokens[0] != ")":
+            res.append( legacy_parse(tokens) )
+            if len(tokens) == 0:
+                raise SyntaxError("microlisp_parse: missing ')'")
+        tokens.pop(0)
+        return res
+    atom = tokens.pop(0)
+    if not microlisp_is_atom(atom):
+        raise SyntaxError("microlisp_parse: invalid atom `%s'" % (atom,))
+    return microlisp_decode_atom(atom)
+
+def legacy_compile(txt):
+    tokens = re.split('(\\s+|\\(|\\))', txt)
+    return legacy_parse([t for t in tokens if len(t) and not t.isspace()])
+
+def wide_text(n):
+    """ (or (eq (env A) v0 v1) ... ) with n `eq' children """
+    return "(or " + " ".join("(eq (env A%d) v%d %d)" % (i % 10, i, i) for i in range(n)) + ")"
+
+def deep_text(n):
+    """ (not (not ... a)) nested n times """
+    return "(not " * n + "a" + ")" * n
+
+def measure(func, txt):
+    number = 3
+    try:
+        return min(timeit.repeat(lambda: func(txt), number=number, repeat=3)) / number
+    except RecursionError:
+        return None
+
+def main():
+    print("%-6s %8s %10s %12s %12s" % ("shape", "n", "tokens", "legacy, s", "current, s"))
+    for shape, make, sizes in [("wide", wide_text, [1000, 2000, 4000, 8000, 16000]),
+                               ("deep", deep_text, [250, 500, 2000, 20000])]:
+        for n in sizes:
+            txt = make(n)
+            ntok = len(re.findall(r'\(|\)|[^\s()]+', txt))
+            old, new = measure(legacy_compile, txt), measure(microlisp_compile, txt)
+            print("%-6s %8d %10d %12s %12.5f" % (shape, n, ntok,
+                "RecursionError" if old is None else "%.5f" % old, new))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+""" MicrolispService benchmark with concurrent clients
+
+Usage: python benchmarks/bench_service.py [--clients 8] [--requests 2000]
+
+Compares compile + microlisp_eval per request with MicrolispService driven
+by threads (evaluate) and by asyncio tasks (aevaluate, batched per loop
+iteration), and prints service metrics.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from microlisp.microlisp import microlisp_compile, microlisp_eval
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, special_optimize
+from microlisp.microlisp_service import MicrolispService
+
+def make_rules(count, rnd):
+    def eq():
+        return "(eq (env A%d) %s)" % (rnd.randrange(8), " ".join("v%d" % rnd.randrange(10) for i in range(3)))
+    return ["(or %s)" % " ".join("(and %s %s)" % (eq(), eq()) for i in range(6)) for r in range(count)]
+
+def make_requests(rules, count, rnd):
+    return [(rnd.choice(rules), {"A%d" % c: "v%d" % rnd.randrange(10) for c in range(8)}) for i in range(count)]
+
+def run_threads(func, requests, clients):
+    chunks = [requests[i::clients] for i in range(clients)]
+    def client(chunk):
+        return [func(source, env) for source, env in chunk]
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, chunks))
+
+def run_async(service, requests, clients):
+    chunks = [requests[i::clients] for i in range(clients)]
+    async def client(chunk):
+        for source, env in chunk:
+            await service.aevaluate(source, env)
+    async def main():
+        await asyncio.gather(*[client(chunk) for chunk in chunks])
+    asyncio.run(main())
+
+def report(name, count, seconds):
+    print("%-28s %10.0f requests/s" % (name, count / seconds))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MicrolispService benchmark")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rules", type=int, default=20)
+    args = parser.parse_args(argv)
+    rnd = random.Random(1)
+    requests = make_requests(make_rules(args.rules, rnd), args.requests, rnd)
+
+    plain = lambda source, env: microlisp_eval(SPECIAL_LISP_FUNC, env, microlisp_compile(source))
+    start = time.perf_counter()
+    run_threads(plain, requests, args.clients)
+    report("compile + eval, threads", len(requests), time.perf_counter() - start)
+
+    service = MicrolispService(SPECIAL_LISP_FUNC, special_optimize)
+    start = time.perf_counter()
+    run_threads(service.evaluate, requests, args.clients)
+    report("service, threads", len(requests), time.perf_counter() - start)
+
+    service_async = MicrolispService(SPECIAL_LISP_FUNC, special_optimize)
+    start = time.perf_counter()
+    run_async(service_async, requests, args.clients)
+    report("service, asyncio", len(requests), time.perf_counter() - start)
+
+    for name, s in [("threads", service), ("asyncio", service_async)]:
+        m = s.metrics()
+        print("%s: hits %d, misses %d, batches %d, mean latency %.1f us, max %.1f us" % (name,
+            m["hits"], m["misses"], m["batches"], m["latency_mean"] * 1e6, m["latency_max"] * 1e6))
+
+if __name__ == "__main__":
+    main()
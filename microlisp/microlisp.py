@@ -1,53 +1,69 @@
 import re
 from functools import partial, reduce
+from operator import itemgetter
+from .microlisp_node import MicrolispNode, microlisp_node, microlisp_intern
+
+_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+_ATOM_RE = re.compile('([A-Z]|[a-z]|[0-9]|[\\.\\+\\*])+')
 
 #https://github.com/DerekHarter/python-lisp-parser/blob/master/src/Python-Lisp-Parser.ipynb
 def microlisp_tokenize(txt):
     """ Split code text to tokens: `(', `)', non-space sequences """
-    tokens = re.split('(\s+|\(|\))', txt)
-    return [t for t in tokens if len(t) and not t.isspace()]    
+    return _TOKEN_RE.findall(txt)
 
 def microlisp_parse(tokens, typ='list'):
-    """ Convert tokens list to tree
+    """ Convert tokens list (or any tokens iterable) to tree
     
+    typ: 'list', 'tuple' or 'node' (interned MicrolispNode)
+    Single pass without recursion, so depth of tree is not limited
+    Tokens of the expression are consumed: removed from list, taken from iterator
     NOTE: expressions like ((some expr) token token) not supported
     """
-    if len(tokens)==0:
-        raise SyntaxError("microlisp_parse: empty tokens list")
-    if tokens[0]=="(":
-        res = []
-        tokens.pop(0)
-        op = tokens.pop(0)
-        if not microlisp_is_atom(op):
-            raise SyntaxError("microlisp_parse: invalid atom `%s'" % (op,))
-        res.append( op )
-        while tokens[0] != ")":
-            res.append( microlisp_parse(tokens, typ) )
-            if len(tokens) == 0:
-                raise SyntaxError("microlisp_parse: missing ')'")
-        if tokens[0] == ")":
-            tokens.pop(0)
+    stack = []
+    atoms = {}
+    expect_op = False
+    for i, token in enumerate(tokens):
+        if expect_op:
+            if not microlisp_is_atom(token):
+                raise SyntaxError("microlisp_parse: invalid atom `%s'" % (token,))
+            stack[-1].append(token)
+            expect_op = False
+            continue
+        if token == "(":
+            stack.append([])
+            expect_op = True
+            continue
+        if token == ")" and stack:
+            res = stack.pop()
+            if typ == 'tuple':
+                res = tuple(res)
+            elif typ == 'node':
+                res = microlisp_node(*res)
         else:
-            raise SyntaxError("microlisp_parse: missing ')'")
-        if typ == 'list':
+            if token in atoms:
+                res = atoms[token]
+            else:
+                if not microlisp_is_atom(token):
+                    raise SyntaxError("microlisp_parse: invalid atom `%s'" % (token,))
+                res = atoms[token] = microlisp_decode_atom(token)
+        if not stack:
+            if isinstance(tokens, list):
+                del tokens[:i+1]
             return res
-        if typ == 'tuple':
-            return tuple(res)
-    else:
-        atom = tokens.pop(0)
-        if not microlisp_is_atom(atom):
-            raise SyntaxError("microlisp_parse: invalid atom `%s'" % (atom,))
-        return microlisp_decode_atom(atom)
+        stack[-1].append(res)
+    if stack:
+        raise SyntaxError("microlisp_parse: missing ')'")
+    raise SyntaxError("microlisp_parse: empty tokens list")
 
 def microlisp_compile(txt, typ='list'):
     """ Convert code text to tree """
-    return microlisp_parse(microlisp_tokenize(txt), typ)
+    return microlisp_parse((m.group() for m in _TOKEN_RE.finditer(txt)), typ)
 
 def microlisp_is_atom(s):
-    return re.fullmatch('([A-Z]|[a-z]|[0-9]|[\\.\\+\\*])+',s) != None
+    return _ATOM_RE.fullmatch(s) != None
 
 def microlisp_is_expression(s):
-    if isinstance(s, tuple) or isinstance(s, list):
+    if isinstance(s, tuple) or isinstance(s, list) or isinstance(s, MicrolispNode):
         return True
     return False
     
@@ -68,11 +84,50 @@ def microlisp_decode_atom(s):
     except: pass
     return s
 
+def build_not(build, a):
+    """ Compiled version of `not' """
+    fa = build(a)
+    return lambda env: not fa(env)
+
+def build_if(build, a, b, c):
+    """ Compiled version of `if' """
+    fa, fb, fc = build(a), build(b), build(c)
+    return lambda env: fb(env) if fa(env) else fc(env)
+
+def _build_reduce(build, aa, stop):
+    """ Compiled reduce(lambda x,y: funeval(x) and/or funeval(y), aa)
+
+    Intermediate result is evaluated again by the next step, like funeval(x),
+    the last one is returned as is
+    """
+    if len(aa) < 2:
+        return None
+    ff = [build(a) for a in aa]
+    first, middle, last = ff[0], ff[1:-1], ff[-1]
+    def func(env):
+        res = first(env)
+        for f in middle:
+            if stop(res): return res
+            res = f(env)
+            if microlisp_is_expression(res):
+                res = build(res)(env)
+        if stop(res): return res
+        return last(env)
+    return func
+
+def build_reduce_and(build, *aa):
+    """ Compiled version of reduce-based `and' """
+    return _build_reduce(build, aa, (lambda res: not res))
+
+def build_reduce_or(build, *aa):
+    """ Compiled version of reduce-based `or' """
+    return _build_reduce(build, aa, bool)
+
 STANDART_LOGIC_FUNC = {
-"not": {"params_count": 1, "commutative": False, "associative": False, "func": (lambda funeval, a: not funeval(a) )},
-"and": {"params_count": -1, "commutative": True, "associative": True, "func": (lambda funeval, *aa: reduce(lambda x,y: funeval(x) and funeval(y), aa) )},
-"or": {"params_count": -1, "commutative": True, "associative": True, "func": (lambda funeval, *aa: reduce(lambda x,y: funeval(x) or funeval(y), aa) )},
-"if": {"params_count": 3, "commutative": False, "associative": False, "func": (lambda funeval, a, b, c: funeval(b) if funeval(a) else funeval(c) )},
+"not": {"params_count": 1, "commutative": False, "associative": False, "func": (lambda funeval, a: not funeval(a) ), "build": build_not},
+"and": {"params_count": -1, "commutative": True, "associative": True, "func": (lambda funeval, *aa: reduce(lambda x,y: funeval(x) and funeval(y), aa) ), "build": build_reduce_and},
+"or": {"params_count": -1, "commutative": True, "associative": True, "func": (lambda funeval, *aa: reduce(lambda x,y: funeval(x) or funeval(y), aa) ), "build": build_reduce_or},
+"if": {"params_count": 3, "commutative": False, "associative": False, "func": (lambda funeval, a, b, c: funeval(b) if funeval(a) else funeval(c) ), "build": build_if},
 }    
     
 def microlisp_eval(funcs, env, expr):
@@ -97,28 +152,188 @@ def microlisp_eval(funcs, env, expr):
             return func_def["func"]( partial(microlisp_eval, funcs, env), *expr[1:] )
     return expr
 
+def microlisp_build(funcs, expr, cse=False):
+    """ Compile expression tree `expr' to function f(env) using functions `funcs'
+
+    Same result as microlisp_eval(funcs, env, expr), but the tree is checked
+    (unknown functions, parameters count) and walked only once, here.
+    Function definition may contain "build": build(build, *params) returning f(env)
+    or None; otherwise "func" is called with parameters as in microlisp_eval
+
+    cse: structurally equal subtrees are compiled once and evaluated
+    at most once per call f(env); such f must not be called from several threads
+    """
+    if cse:
+        roots, current = build_shared(funcs, [expr])
+        root = roots[0]
+        def cse_func(env):
+            current[0] = object()
+            return root(env)
+        return cse_func
+    return build_node(funcs, expr, partial(microlisp_build, funcs))
+
+def microlisp_build_many(funcs, exprs):
+    """ Compile expression trees `exprs' to one function f(env) returning list of results
+
+    Structurally equal subtrees of all expressions are compiled once and
+    evaluated at most once per call f(env); f must not be called from several threads
+    """
+    roots, current = build_shared(funcs, exprs)
+    def many_func(env):
+        current[0] = object()
+        return [root(env) for root in roots]
+    return many_func
+
+def build_node(funcs, expr, build):
+    """ Compile one node of expression tree, parameters are compiled by build(param) """
+    if not microlisp_is_expression(expr):
+        return lambda env: expr
+    params = expr[1:]
+    if expr[0] == "env":
+        if len(params) != 1:
+            raise RuntimeError("invalid parameters count for `%s'" % (expr[0],))
+        key = params[0]
+        if microlisp_is_expression(key):
+            fkey = build(key)
+            def env_func(env):
+                try:
+                    return env[fkey(env)]
+                except KeyError:
+                    raise RuntimeError("unknown key for `env': `%s'" % (key,))
+        else:
+            def env_func(env):
+                try:
+                    return env[key]
+                except KeyError:
+                    raise RuntimeError("unknown key for `env': `%s'" % (key,))
+        return env_func
+    if expr[0] not in funcs:
+        raise RuntimeError("unknown function `%s'" % (expr[0],))
+    func_def = funcs[expr[0]]
+    if (len(params) != func_def["params_count"]) and (func_def["params_count"]!=-1):
+        raise RuntimeError("invalid parameters count for `%s'" % (expr[0],))
+    if "build" in func_def:
+        res = func_def["build"](build, *params)
+        if res is not None:
+            return res
+    func = func_def["func"]
+    built = {id(p): build(p) for p in params if microlisp_is_expression(p)}
+    def call_func(env):
+        def funeval(a):
+            f = built.get(id(a))
+            if f is None:
+                return microlisp_eval(funcs, env, a)
+            return f(env)
+        return func(funeval, *params)
+    return call_func
+
+def _build_memo(f, current):
+    """ Wrap f(env): evaluate once while current[0] is the same """
+    cell = [None, None]
+    def memo(env):
+        if cell[0] is current[0]:
+            return cell[1]
+        res = f(env)
+        cell[0] = current[0]
+        cell[1] = res
+        return res
+    return memo
+
+def build_shared(funcs, exprs):
+    """ Compile expression trees `exprs' sharing structurally equal subtrees
+
+    Return (list of f(env), current). Subtrees referenced more than once are
+    evaluated once while current[0] is not changed: set current[0] = object()
+    before evaluating for new env
+    """
+    keys = {}
+    first = []
+    refs = []
+    numbers = {}
+    def number(expr):
+        key = (expr[0],)+tuple(number(e) if microlisp_is_expression(e) else (e.__class__, e) for e in expr[1:])
+        n = keys.get(key)
+        if n is None:
+            n = keys[key] = len(first)
+            first.append(expr)
+            refs.append(0)
+            for c in key[1:]:
+                if isinstance(c, int): refs[c] += 1
+        numbers[id(expr)] = n
+        return n
+    for expr in exprs:
+        if microlisp_is_expression(expr):
+            refs[number(expr)] += 1
+    closures = {}
+    current = [object()]
+    def build(expr):
+        n = numbers.get(id(expr)) if microlisp_is_expression(expr) else None
+        if n is None:
+            return build_node(funcs, expr, build)
+        f = closures.get(n)
+        if f is None:
+            f = build_node(funcs, first[n], build)
+            if refs[n] > 1:
+                f = _build_memo(f, current)
+            closures[n] = f
+        return f
+    return [build(expr) for expr in exprs], current
+
+def microlisp_freeze(expr):
+    """ Convert expression tree to hashable form (nested tuples)
+
+    Atoms except strings are kept with their type, so true, 1 and 1.0 differ
+    """
+    if microlisp_is_expression(expr):
+        return tuple(map(microlisp_freeze, expr))
+    if isinstance(expr, str):
+        return expr
+    return (expr.__class__, expr)
+
+def microlisp_thaw(key):
+    """ Convert result of microlisp_freeze back to tree of lists """
+    if isinstance(key, tuple):
+        if isinstance(key[0], type):
+            return key[1]
+        return list(map(microlisp_thaw, key))
+    return key
+
 def microlisp_dumps(expr):
-    """ Convert expression tree to string """
+    """ Convert expression tree to string, readable by microlisp_compile """
     if microlisp_is_expression(expr):
         return "("+expr[0]+(" " if len(expr)>1 else "")+(" ".join(list(map(microlisp_dumps,expr[1:]))) )+")"
+    elif isinstance(expr, bool):
+        return "true" if expr else "false"
     else:
         return str(expr)
     
 def ml_sortkey(expr):
     """ Helper function for microlisp_sort """
     if microlisp_is_expression(expr):
-        return "0-"+expr[0]+("".join(list(map(ml_sortkey, expr[1:]))))
+        return "0-"+expr[0]+"".join(map(ml_sortkey, expr[1:]))
     else:
         return "1-"+str(expr)
 
-def microlisp_sort(funcs, expr):
-    """ Recursive sort commutative functions arguments """
+def ml_sort_keyed(funcs, expr):
+    """ Return (microlisp_sort(funcs, expr), its ml_sortkey)
+
+    Key of every node is built once from keys of sorted children
+    """
     if not microlisp_is_expression(expr):
-        return expr
-    lst = list(map(partial(microlisp_sort,funcs), expr[1:]))
+        return expr, "1-"+str(expr)
+    lst = [ml_sort_keyed(funcs, e) for e in expr[1:]]
     if (expr[0] in funcs) and funcs[expr[0]]["commutative"]:
-        lst.sort(key=ml_sortkey)
-    return [expr[0]]+lst
+        lst.sort(key=itemgetter(1))
+    return [expr[0]]+[e for e, k in lst], "0-"+expr[0]+"".join([k for e, k in lst])
+
+def microlisp_sort(funcs, expr):
+    """ Recursive sort commutative functions arguments
+
+    Result is interned MicrolispNode for MicrolispNode `expr', list otherwise
+    """
+    if isinstance(expr, MicrolispNode):
+        return microlisp_intern(ml_sort_keyed(funcs, expr)[0])
+    return ml_sort_keyed(funcs, expr)[0]
 
 def microlisp_optimize(funcs, expr):
     """ Optimize (remove duplicate) arguments of associative functions """
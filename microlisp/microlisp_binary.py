@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+import io
+import mmap
+import struct
+import sys
+from array import array
+from .microlisp import microlisp_is_expression
+from .microlisp_node import microlisp_node
+
+""" Compact binary format for many expression trees
+
+File layout (little-endian):
+    MAGIC
+    records: uint32 nodes count, 2 array type codes (B, H or I),
+        sizes array and symbols array of nodes in preorder:
+        size 0 - atom, otherwise len(expression),
+        symbol - index of atom or function name in symbols table
+    footer: uint32 symbols count, symbols (type byte + value),
+        uint64 records count, uint64 offset of every record
+    trailer: uint64 footer offset, MAGIC
+
+Writer streams records and writes footer on close, reader maps file and
+decodes records by index.
+"""
+
+MAGIC = b"MLB\x01"
+_TRAILER = struct.Struct("<Q4s")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_RECORD = struct.Struct("<Icc")
+_SWAP = (sys.byteorder != "little")
+
+def _typecode(maxvalue):
+    """ Smallest unsigned array type for values up to `maxvalue' """
+    if maxvalue < (1 << 8):
+        return "B"
+    if maxvalue < (1 << 16):
+        return "H"
+    return "I"
+
+def _encode_symbol(value):
+    if value is True:
+        return b"T"
+    if value is False:
+        return b"F"
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return b"s"+_U32.pack(len(data))+data
+    if isinstance(value, int):
+        if -(1 << 63) <= value < (1 << 63):
+            return b"i"+_I64.pack(value)
+        data = str(value).encode("ascii")
+        return b"I"+_U32.pack(len(data))+data
+    if isinstance(value, float):
+        return b"f"+_F64.pack(value)
+    raise TypeError("microlisp_binary: unsupported atom `%r'" % (value,))
+
+def _decode_symbols(buf, pos):
+    count, = _U32.unpack_from(buf, pos)
+    pos += 4
+    symbols = []
+    for i in range(count):
+        tag = bytes(buf[pos:pos+1])
+        pos += 1
+        if tag == b"T":
+            symbols.append(True)
+        elif tag == b"F":
+            symbols.append(False)
+        elif tag == b"i":
+            symbols.append(_I64.unpack_from(buf, pos)[0])
+            pos += 8
+        elif tag == b"f":
+            symbols.append(_F64.unpack_from(buf, pos)[0])
+            pos += 8
+        elif tag == b"s" or tag == b"I":
+            size, = _U32.unpack_from(buf, pos)
+            data = bytes(buf[pos+4:pos+4+size])
+            pos += 4+size
+            symbols.append(data.decode("utf-8") if tag == b"s" else int(data))
+        else:
+            raise ValueError("microlisp_binary: invalid symbol type %r" % (tag,))
+    return symbols, pos
+
+class MicrolispBinaryWriter(object):
+    """ Write expression trees to binary file object `fh' (opened with 'wb')
+
+    Call close() (or use `with') to write footer, `fh' itself is not closed
+    """
+    def __init__(self, fh):
+        self._fh = fh
+        self._pos = 0
+        self._symbols = {}
+        self._symbols_data = []
+        self._offsets = array("Q")
+        self._write(MAGIC)
+
+    def _write(self, data):
+        self._fh.write(data)
+        self._pos += len(data)
+
+    def _symbol(self, value):
+        key = (value.__class__, value)
+        n = self._symbols.get(key)
+        if n is None:
+            n = self._symbols[key] = len(self._symbols_data)
+            self._symbols_data.append(_encode_symbol(value))
+        return n
+
+    def write(self, expr):
+        """ Append one expression tree, return its index """
+        sizes = []
+        symbols = []
+        stack = [expr]
+        while stack:
+            e = stack.pop()
+            if microlisp_is_expression(e):
+                sizes.append(len(e))
+                symbols.append(self._symbol(e[0]))
+                for i in range(len(e)-1, 0, -1):
+                    stack.append(e[i])
+            else:
+                sizes.append(0)
+                symbols.append(self._symbol(e))
+        sizes = array(_typecode(max(sizes)), sizes)
+        symbols = array(_typecode(max(symbols)), symbols)
+        if _SWAP:
+            sizes.byteswap()
+            symbols.byteswap()
+        self._offsets.append(self._pos)
+        self._write(_RECORD.pack(len(sizes), sizes.typecode.encode("ascii"), symbols.typecode.encode("ascii")))
+        self._write(sizes.tobytes())
+        self._write(symbols.tobytes())
+        return len(self._offsets)-1
+
+    def close(self):
+        footer = self._pos
+        self._write(_U32.pack(len(self._symbols_data)))
+        self._write(b"".join(self._symbols_data))
+        self._write(_U64.pack(len(self._offsets)))
+        offsets = array("Q", self._offsets)
+        if _SWAP:
+            offsets.byteswap()
+        self._write(offsets.tobytes())
+        self._write(_TRAILER.pack(footer, MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class MicrolispBinaryReader(object):
+    """ Random access to expression trees of binary file
+
+    source: file name (memory-mapped) or bytes-like object
+    typ: 'list', 'tuple' or 'node' (interned MicrolispNode)
+    """
+    def __init__(self, source, typ='list'):
+        self.typ = typ
+        self._file = None
+        self._map = None
+        if isinstance(source, str):
+            self._file = open(source, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buf = memoryview(self._map)
+        else:
+            self._buf = memoryview(source)
+        size = len(self._buf)
+        if size < len(MAGIC)+_TRAILER.size or bytes(self._buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError("microlisp_binary: invalid file")
+        footer, magic = _TRAILER.unpack_from(self._buf, size-_TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError("microlisp_binary: invalid file")
+        self._symbols, pos = _decode_symbols(self._buf, footer)
+        count, = _U64.unpack_from(self._buf, pos)
+        pos += 8
+        self._offsets = array("Q")
+        self._offsets.frombytes(self._buf[pos:pos+8*count])
+        if _SWAP:
+            self._offsets.byteswap()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, i):
+        pos = self._offsets[i]
+        count, size_code, symbol_code = _RECORD.unpack_from(self._buf, pos)
+        pos += _RECORD.size
+        sizes = array(size_code.decode("ascii"))
+        sizes.frombytes(self._buf[pos:pos+count*sizes.itemsize])
+        pos += count*sizes.itemsize
+        symbols = array(symbol_code.decode("ascii"))
+        symbols.frombytes(self._buf[pos:pos+count*symbols.itemsize])
+        if _SWAP:
+            sizes.byteswap()
+            symbols.byteswap()
+        return self._decode(sizes, symbols)
+
+    def __iter__(self):
+        for i in range(len(self._offsets)):
+            yield self[i]
+
+    def _decode(self, sizes, symbols):
+        table = self._symbols
+        typ = self.typ
+        stack = []
+        for size, symbol in zip(sizes, symbols):
+            value = table[symbol]
+            if size > 1:
+                stack.append([[value], size-1])
+                continue
+            if size == 1:
+                value = [value]
+                if typ == 'tuple':
+                    value = tuple(value)
+                elif typ == 'node':
+                    value = microlisp_node(*value)
+            # attach complete value to parents, completing them too
+            while stack:
+                top = stack[-1]
+                top[0].append(value)
+                top[1] -= 1
+                if top[1] > 0:
+                    break
+                stack.pop()
+                value = top[0]
+                if typ == 'tuple':
+                    value = tuple(value)
+                elif typ == 'node':
+                    value = microlisp_node(*value)
+            else:
+                return value
+        raise ValueError("microlisp_binary: truncated record")
+
+    def close(self):
+        self._buf.release()
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def microlisp_dumpb(exprs):
+    """ Convert expression trees to bytes """
+    buf = io.BytesIO()
+    with MicrolispBinaryWriter(buf) as writer:
+        for expr in exprs:
+            writer.write(expr)
+    return buf.getvalue()
+
+def microlisp_loadb(data, typ='list'):
+    """ Convert bytes of microlisp_dumpb to list of expression trees """
+    with MicrolispBinaryReader(data, typ) as reader:
+        return list(reader)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+""" Row bitsets and value indexes of env columns
+
+Bitset of rows is Python int: bit i is set for row i, so `and', `or', `not'
+over all rows are single big integer operations.
+"""
+
+def bits_from_list(values):
+    """ Bitset of list: bit i is truth of values[i] """
+    if not values:
+        return 0
+    return int("".join(["1" if v else "0" for v in reversed(values)]), 2)
+
+def bits_from_positions(positions, size):
+    """ Bitset with bits `positions' set """
+    data = bytearray((size + 7) // 8)
+    for i in positions:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bytes(data), "little")
+
+def bits_to_list(bits, size):
+    """ List of booleans of `size' first bits """
+    return [c == "1" for c in reversed(bin(bits)[2:].zfill(size)[-size:])] if size else []
+
+def bits_count(bits):
+    return bin(bits).count("1")
+
+class MicrolispIndex(object):
+    """ Indexes value -> rows for env columns of `dataset' (list of env)
+
+    Index of a column (row positions of each value) is built once, on first use;
+    bitset of a value is built only when the value is queried, so memory
+    stays O(rows) per column for any count of distinct values
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset if isinstance(dataset, list) else list(dataset)
+        self.size = len(self.dataset)
+        self.all = (1 << self.size) - 1
+        self._columns = {}
+        self._bits = {}
+
+    def column(self, key):
+        """ Return dict value -> list of rows for column `key', None if values are not hashable """
+        if key in self._columns:
+            return self._columns[key]
+        index = {}
+        try:
+            for i, env in enumerate(self.dataset):
+                index.setdefault(env[key], []).append(i)
+        except KeyError:
+            raise RuntimeError("unknown key for `env': `%s'" % (key,))
+        except TypeError:
+            index = None
+        self._columns[key] = index
+        return index
+
+    def eq(self, key, values):
+        """ Bitset of rows where column `key' is equal to any of `values', None if not indexed """
+        index = self.column(key)
+        if index is None:
+            return None
+        bits = 0
+        for v in values:
+            try:
+                positions = index.get(v)
+            except TypeError:
+                return None
+            if positions is None:
+                continue
+            k = (key, v)
+            b = self._bits.get(k)
+            if b is None:
+                b = self._bits[k] = bits_from_positions(positions, self.size)
+            bits |= b
+        return bits
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+""" Bounded caches for long-running jobs
+
+"""
+
+class LRUCache(object):
+    """ Mapping with bounded size, least recently used items are evicted first
+
+    maxsize: maximum items count, None - unbounded
+    """
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """ Return cached value or `default', count hit or miss """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if (self.maxsize is not None) and (len(self._data) > self.maxsize):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        """ Return dict: hits, misses, evictions, size, maxsize """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._data), "maxsize": self.maxsize}
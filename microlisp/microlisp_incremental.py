@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from .microlisp import microlisp_build, microlisp_is_expression
+from .microlisp_node import MicrolispNode, microlisp_intern
+from .microlisp_special import SPECIAL_LISP_FUNC
+from .microlisp_cache import LRUCache
+from .microlisp_bitset import MicrolispIndex, bits_from_list, bits_to_list, bits_count
+
+""" Incremental evaluation of expressions on a fixed dataset
+
+Result of every subtree over all rows is kept per interned node, so an
+expression that differs from an already evaluated one (tree_generator
+candidate and its parent) computes only its new nodes: the changed path.
+"""
+
+class _Bits(object):
+    """ Bitset result of subtree, distinct from integer atoms """
+    __slots__ = ("bits",)
+
+    def __init__(self, bits):
+        self.bits = bits
+
+class IncrementalEvaluator(object):
+    """ Evaluate expressions on `dataset' (list of env), caching subtree results
+
+    funcs: functions definition; `and', `or', `not', `eq', `if' with functions
+    of SPECIAL_LISP_FUNC are computed on bitsets of rows, other functions per row
+    maxsize: maximum cached subtree results (LRUCache)
+    index: MicrolispIndex of dataset, (eq (env key) atom ...) is OR of its bitsets
+    Rows of dataset must contain all keys used by (env key)
+    """
+    def __init__(self, funcs, dataset, maxsize=65536, index=None):
+        self.funcs = funcs
+        self.index = index if index is not None else MicrolispIndex(dataset)
+        self.dataset = self.index.dataset
+        self.size = self.index.size
+        self.all = self.index.all
+        self.cache = LRUCache(maxsize)
+        self._ops = {}
+        for name in ("and", "or", "not", "eq", "if"):
+            if name in funcs and funcs[name]["func"] is SPECIAL_LISP_FUNC[name]["func"]:
+                self._ops[name] = getattr(self, "_" + name)
+
+    def evaluate(self, expr):
+        """ Return bitset: bit i is truth of `expr' on row i """
+        return self._truth(self._result(microlisp_intern(expr)))
+
+    def count(self, expr):
+        """ Count of rows where `expr' is true """
+        return bits_count(self.evaluate(expr))
+
+    def values(self, expr):
+        """ Return list of `expr' values on rows """
+        return list(self._column(self._result(microlisp_intern(expr))))
+
+    def _result(self, node):
+        """ Bitset (_Bits), list of values, or atom for constant """
+        if not isinstance(node, MicrolispNode):
+            return node
+        res = self.cache.get(node)
+        if res is None:
+            op = self._ops.get(node[0])
+            if node[0] == "env" and len(node) == 2 and not microlisp_is_expression(node[1]):
+                res = self._env(node[1])
+            elif op is not None:
+                res = op(*node[1:])
+            else:
+                f = microlisp_build(self.funcs, node)
+                res = [f(env) for env in self.dataset]
+            self.cache.put(node, res)
+        return res
+
+    def _truth(self, res):
+        if isinstance(res, list):
+            return bits_from_list(res)
+        if isinstance(res, _Bits):
+            return res.bits
+        return self.all if res else 0
+
+    def _column(self, res):
+        if isinstance(res, list):
+            return res
+        if isinstance(res, _Bits):
+            return bits_to_list(res.bits, self.size)
+        return [res] * self.size
+
+    def _env(self, key):
+        try:
+            return [env[key] for env in self.dataset]
+        except KeyError:
+            raise RuntimeError("unknown key for `env': `%s'" % (key,))
+
+    def _and(self, *aa):
+        bits = self.all
+        for a in aa:
+            bits &= self._truth(self._result(a))
+        return _Bits(bits)
+
+    def _or(self, *aa):
+        bits = 0
+        for a in aa:
+            bits |= self._truth(self._result(a))
+        return _Bits(bits)
+
+    def _not(self, a):
+        return _Bits(self.all ^ self._truth(self._result(a)))
+
+    def _if(self, a, b, c):
+        cond = bits_to_list(self._truth(self._result(a)), self.size)
+        vb, vc = self._column(self._result(b)), self._column(self._result(c))
+        return [x if t else y for t, x, y in zip(cond, vb, vc)]
+
+    def _eq(self, o1, *o2):
+        atoms = tuple(v for v in o2 if not microlisp_is_expression(v))
+        bits = None
+        if isinstance(o1, MicrolispNode) and o1[0] == "env" and len(o1) == 2 and not microlisp_is_expression(o1[1]):
+            bits = self.index.eq(o1[1], atoms)
+        v1 = None
+        if bits is None:
+            v1 = self._column(self._result(o1))
+            bits = bits_from_list([v in atoms for v in v1])
+        for v2 in o2:
+            if microlisp_is_expression(v2):
+                if v1 is None:
+                    v1 = self._column(self._result(o1))
+                bits |= bits_from_list([v == w for v, w in zip(v1, self._column(self._result(v2)))])
+        return _Bits(bits)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import weakref
+
+""" Hash-consed immutable expression nodes
+
+MicrolispNode behaves like tuple (op, param1, ...) for microlisp functions.
+Nodes are interned: equal trees are one object while alive, so subtrees are
+shared instead of copied, and == / hash are identity checks.
+"""
+
+_NODES = weakref.WeakValueDictionary()
+
+def _node_key(items):
+    # atoms True, 1 and 1.0 are equal for dict, but must give different nodes
+    return tuple(i if isinstance(i, (str, MicrolispNode)) else (i.__class__, i) for i in items)
+
+class MicrolispNode(object):
+    """ Interned expression node, create with microlisp_node or microlisp_intern """
+    __slots__ = ("_items", "__weakref__")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MicrolispNode is immutable")
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    __hash__ = object.__hash__
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (microlisp_node, self._items)
+
+    def __repr__(self):
+        return "MicrolispNode" + repr(self._items)
+
+def microlisp_node(*items):
+    """ Return interned node (op, param1, ...), params must be atoms or nodes """
+    key = _node_key(items)
+    node = _NODES.get(key)
+    if node is None:
+        node = object.__new__(MicrolispNode)
+        object.__setattr__(node, "_items", items)
+        _NODES[key] = node
+    return node
+
+def microlisp_intern(expr):
+    """ Convert expression tree of lists/tuples to interned nodes """
+    if isinstance(expr, (list, tuple)):
+        return microlisp_node(*[microlisp_intern(e) for e in expr])
+    return expr
+
+def microlisp_intern_size():
+    """ Count of alive interned nodes """
+    return len(_NODES)
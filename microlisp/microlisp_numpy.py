@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from .microlisp import microlisp_eval, microlisp_is_expression
+import numpy as np
+
+""" Vectorized evaluation of `and', `or', `not', `if', `eq' over columns
+
+Environment is columnar: dict of arrays (or lists) or NumPy structured array,
+(env X) returns whole column X, functions work with boolean masks.
+"""
+
+def vector_truth(v):
+    """ Convert values array to boolean mask (Python truth of each element) """
+    v = np.asarray(v)
+    if v.dtype == bool:
+        return v
+    if v.dtype.kind in "US":
+        return v != v.dtype.type()
+    if v.dtype.kind == "O":
+        return np.frompyfunc(bool, 1, 1)(v).astype(bool)
+    return v.astype(bool)
+
+def vector_notop(funeval, a):
+    return np.logical_not(vector_truth(funeval(a)))
+
+def vector_andop(funeval, *aa):
+    """ Mask version of `and', remaining arguments are skipped when mask is all false """
+    res = np.asarray(True)
+    for a in aa:
+        res = np.logical_and(res, vector_truth(funeval(a)))
+        if not res.any(): break
+    return res
+
+def vector_orop(funeval, *aa):
+    """ Mask version of `or', remaining arguments are skipped when mask is all true """
+    res = np.asarray(False)
+    for a in aa:
+        res = np.logical_or(res, vector_truth(funeval(a)))
+        if res.all(): break
+    return res
+
+def vector_ifop(funeval, a, b, c):
+    """ Mask version of `if', branches of different types are kept as Python objects """
+    vb, vc = np.asarray(funeval(b)), np.asarray(funeval(c))
+    if vb.dtype != vc.dtype:
+        vb, vc = vb.astype(object), vc.astype(object)
+    return np.where(vector_truth(funeval(a)), vb, vc)
+
+def vector_isin(v1, values):
+    """ Mask of v1 elements equal to any of atoms `values' """
+    v1 = np.asarray(v1)
+    if v1.dtype.kind == "O":
+        return np.frompyfunc(lambda x: x in values, 1, 1)(v1).astype(bool)
+    if v1.dtype.kind in "US":
+        values = [v for v in values if isinstance(v, str)]
+    else:
+        values = [v for v in values if not isinstance(v, str)]
+    if len(values) == 0:
+        return np.zeros(v1.shape, dtype=bool)
+    if len(values) == 1:
+        return np.asarray(v1 == values[0])
+    return np.isin(v1, values)
+
+def vector_eqop(funeval, o1, *o2):
+    """ Mask version of `eq', atoms are checked with one set-membership test """
+    v1 = funeval(o1) if microlisp_is_expression(o1) else o1
+    atoms = tuple(v2 for v2 in o2 if not microlisp_is_expression(v2))
+    res = vector_isin(v1, atoms)
+    for v2 in o2:
+        if microlisp_is_expression(v2):
+            res = np.logical_or(res, np.asarray(v1) == np.asarray(funeval(v2)))
+    return res
+
+VECTOR_LISP_FUNC = {
+"not": {"params_count": 1, "commutative": False, "associative": False, "func": vector_notop},
+"and": {"params_count": -1, "commutative": True, "associative": True, "func": vector_andop},
+"or": {"params_count": -1, "commutative": True, "associative": True, "func": vector_orop},
+"if": {"params_count": 3, "commutative": False, "associative": False, "func": vector_ifop},
+"eq": {"params_count": -1, "commutative": False, "associative": False, "func": vector_eqop},
+}
+
+def vector_columns(columns):
+    """ Convert structured array or dict of sequences to dict of arrays """
+    names = getattr(getattr(columns, "dtype", None), "names", None)
+    if names is not None:
+        return {name: columns[name] for name in names}
+    return {k: np.asarray(v) for k, v in columns.items()}
+
+def microlisp_vector_eval(funcs, columns, expr):
+    """ Evaluate expression tree `expr' on all rows of `columns' at once
+
+    funcs: vector functions definition, like VECTOR_LISP_FUNC
+    columns: dict of equal length arrays or NumPy structured array
+    Return array with one result per row
+    """
+    env = vector_columns(columns)
+    size = len(next(iter(env.values()))) if len(env) else 0
+    res = np.asarray(microlisp_eval(funcs, env, expr))
+    if res.shape != (size,):
+        res = np.array(np.broadcast_to(res, (size,)))
+    return res
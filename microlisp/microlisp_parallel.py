@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import queue
+from collections import deque
+from itertools import islice
+from .microlisp import microlisp_build
+
+""" Parallel scoring of candidate expressions (e.g. tree_generator output)
+
+Functions, dataset and score function are sent to each worker process once,
+as pool initializer arguments. With `fork' start method (default where
+available) workers inherit them from parent memory without pickling.
+"""
+
+_WORKER = {}
+
+def _init_worker(funcs, dataset, score):
+    _WORKER["funcs"] = funcs
+    _WORKER["dataset"] = dataset
+    _WORKER["score"] = score
+
+def _score_chunk(chunk):
+    funcs, dataset, score = _WORKER["funcs"], _WORKER["dataset"], _WORKER["score"]
+    return [(expr, score(funcs, dataset, expr)) for expr in chunk]
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _done_chunk(done):
+    """ Wait next completed chunk, raise exception of failed one """
+    chunk = done.get()
+    if isinstance(chunk, BaseException):
+        raise chunk
+    return chunk
+
+def score_count(funcs, dataset, expr):
+    """ Default score: count of objects in `dataset' where `expr' is true """
+    f = microlisp_build(funcs, expr)
+    return sum(1 for env in dataset if f(env))
+
+def parallel_score(funcs, candidates, dataset, score=score_count, workers=None, chunk_size=16, ordered=True, context=None, max_pending=None):
+    """ Score expressions in process pool, yield (expr, score)
+
+    funcs: functions definition
+    candidates: iterable of expression trees, consumed lazily by chunks
+    dataset: list of environments, sent to workers once
+    score: score(funcs, dataset, expr), top-level function
+    workers: processes count, None - CPU count
+    chunk_size: expressions per task
+    ordered: yield results in order of candidates, otherwise as chunks complete
+    context: multiprocessing context, default `fork' if available
+    max_pending: chunks submitted and not yet yielded, default workers * 2;
+    next chunk of candidates is taken only when one of them is yielded
+    """
+    if context is None:
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+    if max_pending is None:
+        max_pending = (workers or os.cpu_count() or 1) * 2
+    with context.Pool(workers, _init_worker, (funcs, dataset, score)) as pool:
+        if ordered:
+            pending = deque()
+            for chunk in _chunks(candidates, chunk_size):
+                pending.append(pool.apply_async(_score_chunk, (chunk,)))
+                if len(pending) >= max_pending:
+                    for res in pending.popleft().get():
+                        yield res
+            while pending:
+                for res in pending.popleft().get():
+                    yield res
+        else:
+            done = queue.Queue()
+            pending = 0
+            for chunk in _chunks(candidates, chunk_size):
+                pool.apply_async(_score_chunk, (chunk,), callback=done.put, error_callback=done.put)
+                pending += 1
+                if pending >= max_pending:
+                    pending -= 1
+                    for res in _done_chunk(done):
+                        yield res
+            while pending:
+                pending -= 1
+                for res in _done_chunk(done):
+                    yield res
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from time import perf_counter
+from .microlisp_special import andop, orop
+
+""" Opt-in profiling of evaluation
+
+Profiled copies of functions table and environment record to MicrolispProfile;
+original tables are not changed, so there is no cost when profiling is not used.
+
+    profile = MicrolispProfile()
+    pfuncs = profile_funcs(SPECIAL_LISP_FUNC, profile)
+    for env in dataset:
+        microlisp_eval(pfuncs, profile_env(env, profile), expr)
+    print(profile.report())
+"""
+
+# lazy functions evaluating each argument once, in order, until result is known
+SHORTCIRCUIT = {andop: False, orop: True}
+
+class MicrolispProfile(object):
+    """ Evaluation statistics by function name
+
+    calls[name]: calls count
+    time[name]: cumulative time in seconds, including nested calls
+    evaluated[name][i]: how often argument at position i was evaluated
+    shortcircuit[name][i]: how often evaluation stopped at argument i
+    """
+    def __init__(self):
+        self.calls = {}
+        self.time = {}
+        self.evaluated = {}
+        self.shortcircuit = {}
+
+    def clear(self):
+        self.__init__()
+
+    def add_call(self, name, seconds):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.time[name] = self.time.get(name, 0.0) + seconds
+
+    def add_shortcircuit(self, name, evaluated, stopped):
+        """ `evaluated' arguments were evaluated, `stopped' - evaluation stopped at last of them """
+        counts = self.evaluated.setdefault(name, [])
+        if len(counts) < evaluated:
+            counts.extend([0] * (evaluated - len(counts)))
+        for i in range(evaluated):
+            counts[i] += 1
+        if stopped:
+            counts = self.shortcircuit.setdefault(name, [])
+            if len(counts) < evaluated:
+                counts.extend([0] * (evaluated - len(counts)))
+            counts[evaluated - 1] += 1
+
+    def report(self):
+        """ Text table sorted by cumulative time """
+        lines = ["%-12s %10s %12s  %s" % ("function", "calls", "time, s", "short-circuit by position")]
+        for name in sorted(self.calls, key=lambda n: -self.time[n]):
+            lines.append("%-12s %10d %12.6f  %s" % (name, self.calls[name], self.time[name],
+                " ".join(map(str, self.shortcircuit.get(name, [])))))
+        return "\n".join(lines)
+
+def _profiled_func(name, func, profile, stop):
+    if stop is None:
+        def profiled(funeval, *aa):
+            start = perf_counter()
+            try:
+                return func(funeval, *aa)
+            finally:
+                profile.add_call(name, perf_counter() - start)
+        return profiled
+    def profiled_shortcircuit(funeval, *aa):
+        count = [0]
+        def counted(a):
+            count[0] += 1
+            return funeval(a)
+        start = perf_counter()
+        try:
+            res = func(counted, *aa)
+        finally:
+            profile.add_call(name, perf_counter() - start)
+        profile.add_shortcircuit(name, count[0], bool(res) == stop and count[0] > 0)
+        return res
+    return profiled_shortcircuit
+
+def profile_funcs(funcs, profile, shortcircuit=SHORTCIRCUIT):
+    """ Return copy of functions table `funcs' recording statistics to `profile'
+
+    shortcircuit: {func: value} - function evaluates arguments in order
+    and stops when result has truth `value', like andop (False) and orop (True);
+    argument positions are recorded only for these functions
+    """
+    res = {}
+    for name, func_def in funcs.items():
+        func_def = {k: v for k, v in func_def.items() if k != "build"} # keep calls visible to microlisp_build
+        func_def["func"] = _profiled_func(name, func_def["func"], profile, shortcircuit.get(func_def["func"]))
+        res[name] = func_def
+    return res
+
+class ProfiledEnv(object):
+    """ Environment wrapper recording `env' lookups """
+    __slots__ = ("env", "profile")
+
+    def __init__(self, env, profile):
+        self.env = env
+        self.profile = profile
+
+    def __getitem__(self, key):
+        start = perf_counter()
+        try:
+            return self.env[key]
+        finally:
+            self.profile.add_call("env", perf_counter() - start)
+
+def profile_env(env, profile):
+    """ Return environment wrapper recording `env' calls to `profile' """
+    return ProfiledEnv(env, profile)
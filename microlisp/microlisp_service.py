@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from time import perf_counter
+from .microlisp import microlisp_compile, microlisp_build
+from .microlisp_cache import LRUCache
+
+""" Evaluation service for request-serving processes
+
+Expressions come as text, compiled functions are cached by text.
+"""
+
+class _Compiling(object):
+    """ Compilation of one source in progress """
+    __slots__ = ("done", "func", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.func = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.func
+
+class MicrolispService(object):
+    """ Thread-safe and asyncio-friendly evaluator of expressions given as text
+
+    funcs: functions definition
+    optimize: optional optimize(funcs, expr) applied once after parsing, e.g. special_optimize
+    maxsize: size of compiled expressions cache (LRU)
+
+    Compiled functions (microlisp_build) keep no state, so they are shared by threads.
+    aevaluate() requests made in one event loop iteration are evaluated as one batch.
+    """
+    def __init__(self, funcs, optimize=None, maxsize=1024):
+        self.funcs = funcs
+        self.optimize = optimize
+        self._lock = threading.Lock()
+        self._cache = LRUCache(maxsize)
+        self._pending = {}
+        self._compiling = {}
+        self._evaluations = 0
+        self._errors = 0
+        self._batches = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def compile(self, source):
+        """ Return compiled function f(env) for expression text `source'
+
+        Source is compiled by one thread, others requesting it meanwhile wait for result
+        """
+        with self._lock:
+            compiling = self._compiling.get(source)
+            if compiling is None:
+                f = self._cache.get(source)
+                if f is not None:
+                    return f
+                compiling = self._compiling[source] = _Compiling()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return compiling.wait()
+        try:
+            expr = microlisp_compile(source)
+            if self.optimize is not None:
+                expr = self.optimize(self.funcs, expr)
+            compiling.func = microlisp_build(self.funcs, expr)
+        except BaseException as e:
+            compiling.error = e
+            raise
+        finally:
+            with self._lock:
+                if compiling.func is not None:
+                    self._cache.put(source, compiling.func)
+                del self._compiling[source]
+            compiling.done.set()
+        return compiling.func
+
+    def _record(self, latencies, errors):
+        with self._lock:
+            self._evaluations += len(latencies)
+            self._errors += errors
+            for t in latencies:
+                self._latency_total += t
+                if t > self._latency_max:
+                    self._latency_max = t
+
+    def evaluate(self, source, env):
+        """ Evaluate expression text `source' on `env' """
+        start = perf_counter()
+        try:
+            res = self.compile(source)(env)
+        except Exception:
+            self._record([perf_counter() - start], 1)
+            raise
+        self._record([perf_counter() - start], 0)
+        return res
+
+    def evaluate_batch(self, requests):
+        """ Evaluate list of (source, env), every distinct source is compiled once
+
+        Return list of results, exception of failed request is raised
+        """
+        start = perf_counter()
+        compiled = {}
+        results = []
+        try:
+            for source, env in requests:
+                f = compiled.get(source)
+                if f is None:
+                    f = compiled[source] = self.compile(source)
+                results.append(f(env))
+        except Exception:
+            self._record([perf_counter() - start] * (len(results) + 1), 1)
+            raise
+        with self._lock:
+            self._batches += 1
+        self._record([perf_counter() - start] * len(results), 0)
+        return results
+
+    async def aevaluate(self, source, env):
+        """ Evaluate expression text `source' on `env' in current event loop batch """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            pending = self._pending.get(loop)
+            if pending is None:
+                pending = self._pending[loop] = []
+                loop.call_soon(self._flush, loop)
+            pending.append((source, env, future, perf_counter()))
+        return await future
+
+    def _flush(self, loop):
+        with self._lock:
+            pending = self._pending.pop(loop, [])
+            self._batches += 1
+        compiled = {}
+        latencies = []
+        errors = 0
+        for source, env, future, start in pending:
+            if future.cancelled():
+                continue
+            try:
+                f = compiled.get(source)
+                if f is None:
+                    f = compiled[source] = self.compile(source)
+                future.set_result(f(env))
+            except Exception as e:
+                errors += 1
+                future.set_exception(e)
+            latencies.append(perf_counter() - start)
+        self._record(latencies, errors)
+
+    def metrics(self):
+        """ Return dict: cache statistics (hits, misses, evictions, size, maxsize),
+        evaluations, errors, batches, latency_total, latency_mean, latency_max (seconds)
+        """
+        with self._lock:
+            res = self._cache.stats()
+            res.update({"evaluations": self._evaluations, "errors": self._errors, "batches": self._batches,
+                "latency_total": self._latency_total, "latency_max": self._latency_max,
+                "latency_mean": self._latency_total / self._evaluations if self._evaluations else 0.0})
+        return res
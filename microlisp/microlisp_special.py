@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
-from .microlisp import microlisp_parse, microlisp_tokenize, microlisp_eval, microlisp_is_expression, microlisp_optimize, ml_sortkey, microlisp_dumps
-import copy
-from functools import partial
+from .microlisp import microlisp_parse, microlisp_tokenize, microlisp_eval, microlisp_build, microlisp_is_expression, microlisp_optimize, ml_sortkey, microlisp_dumps, microlisp_freeze, microlisp_thaw, build_not, build_if
+from .microlisp_node import MicrolispNode, microlisp_intern
+from operator import itemgetter
 
 """ Generator and optimizator for systems with `and', `or', `eq'
 
@@ -34,12 +34,99 @@ def orop(funeval, *aa):
         if funeval(a): return True
     return False
 
+def build_eq(build, o1, *o2):
+    """ Compiled version of `eq' """
+    f1 = build(o1)
+    if not any(map(microlisp_is_expression, o2)):
+        values = tuple(o2)
+        return lambda env: f1(env) in values
+    ff = [(build(v2), microlisp_is_expression(v2), v2) for v2 in o2]
+    def func(env):
+        v1 = f1(env)
+        for f2, is_expr, v2 in ff:
+            if is_expr:
+                if v1 == f2(env): return True
+            else:
+                if v1 == v2: return True
+        return False
+    return func
+
+def build_and(build, *aa):
+    """ Compiled version of andop """
+    ff = [build(a) for a in aa]
+    def func(env):
+        for f in ff:
+            if not f(env): return False
+        return True
+    return func
+
+def build_or(build, *aa):
+    """ Compiled version of orop """
+    ff = [build(a) for a in aa]
+    def func(env):
+        for f in ff:
+            if f(env): return True
+        return False
+    return func
+
+def simplify_not(expr):
+    """ (not true) -> false, (not false) -> true, (not (not a)) -> a """
+    if len(expr) != 2:
+        return expr
+    a = expr[1]
+    if a is True: return False
+    if a is False: return True
+    if microlisp_is_expression(a) and (a[0] == "not") and (len(a) == 2):
+        return a[1]
+    return expr
+
+def _simplify_andor(expr, unit, zero, dual):
+    params = expr[1:]
+    if any(p is zero for p in params):
+        return zero
+    keys = set(map(microlisp_freeze, params))
+    for p in params:
+        # complement: a and (not a)
+        if microlisp_is_expression(p) and (p[0] == "not") and (len(p) == 2) and (microlisp_freeze(p[1]) in keys):
+            return zero
+    res = []
+    for p in params:
+        if p is unit: continue
+        # absorption: (or a (and a b)) -> (or a)
+        if microlisp_is_expression(p) and (p[0] == dual) and any(microlisp_freeze(q) in keys for q in p[1:]): continue
+        res.append(p)
+    if len(res) == len(params):
+        return expr
+    if len(res) == 0:
+        return unit
+    return [expr[0]]+res
+
+def simplify_and(expr):
+    """ Constants, complement and absorption for `and' """
+    return _simplify_andor(expr, True, False, "or")
+
+def simplify_or(expr):
+    """ Constants, complement and absorption for `or' """
+    return _simplify_andor(expr, False, True, "and")
+
+def simplify_if(expr):
+    """ (if true b c) -> b, (if false b c) -> c """
+    if len(expr) != 4:
+        return expr
+    if expr[1] is True: return expr[2]
+    if expr[1] is False: return expr[3]
+    return expr
+
 SPECIAL_LISP_FUNC = {
-"not": {"params_count": 1, "commutative": False, "associative": False, "func": (lambda funeval, a: not funeval(a) )},
-"and": {"params_count": -1, "commutative": True, "associative": True, "func": andop},
-"or": {"params_count": -1, "commutative": True, "associative": True, "func": orop},
-"if": {"params_count": 3, "commutative": False, "associative": False, "func": (lambda funeval, a, b, c: funeval(b) if funeval(a) else funeval(c) )},
-"eq": {"params_count": -1, "commutative": False, "associative": False, "func": eqop},
+"not": {"params_count": 1, "commutative": False, "associative": False, "func": (lambda funeval, a: not funeval(a) ), "build": build_not,
+    "simplify": [simplify_not]},
+"and": {"params_count": -1, "commutative": True, "associative": True, "func": andop, "build": build_and,
+    "simplify": [simplify_and]},
+"or": {"params_count": -1, "commutative": True, "associative": True, "func": orop, "build": build_or,
+    "simplify": [simplify_or]},
+"if": {"params_count": 3, "commutative": False, "associative": False, "func": (lambda funeval, a, b, c: funeval(b) if funeval(a) else funeval(c) ), "build": build_if,
+    "simplify": [simplify_if]},
+"eq": {"params_count": -1, "commutative": False, "associative": False, "func": eqop, "build": build_eq},
 }
 
 def shrink_andor(expr):
@@ -47,27 +134,46 @@ def shrink_andor(expr):
         return expr[1]
     return expr
 
+def _eq_key(v):
+    """ Hashable key of `v' with the same equality (lists become tuples) """
+    if microlisp_is_expression(v):
+        return tuple(map(_eq_key, v))
+    return v
+
 def shrink_eq(expr):
-    """ Shrink (or (eq a ...) (eq a ..)) to (eq a b1 b2 ...)"""
+    """ Shrink (or (eq a ...) (eq a ..)) to (eq a b1 b2 ...)
+
+    All `eq' with the same `a' are merged in one pass into the place of the first one
+    """
     if expr[0] != "or": return expr
-    for i in range(1,len(expr)-1):
-        for j in range(i+1,len(expr)):
-            if microlisp_is_expression(expr[i]) and microlisp_is_expression(expr[j]) and \
-                (expr[i][0] == "eq") and (expr[j][0] == "eq") and \
-                (expr[i][1] == expr[j][1]):
-                newsub = ["eq", expr[i][1]]
-                for e in (expr[i][2:]+expr[j][2:]):
-                    if e in newsub: continue
-                    newsub.append(e)
-                newexpr = copy.copy(expr)
-                newexpr[i] = newsub
-                del newexpr[j]
-                return newexpr
-    return expr
+    groups = {}
+    for i in range(1, len(expr)):
+        e = expr[i]
+        if microlisp_is_expression(e) and (len(e) > 1) and (e[0] == "eq"):
+            groups.setdefault(_eq_key(e[1]), []).append(i)
+    newexpr = None
+    for key, positions in groups.items():
+        if len(positions) < 2: continue
+        if newexpr is None:
+            newexpr = list(expr)
+        first = expr[positions[0]]
+        newsub = ["eq", first[1]]
+        seen = {"eq": None, key: None}
+        for i in positions:
+            for e in expr[i][2:]:
+                k = _eq_key(e)
+                if k in seen: continue
+                seen[k] = None
+                newsub.append(e)
+            newexpr[i] = None
+        newexpr[positions[0]] = newsub
+    if newexpr is None:
+        return expr
+    return [e for e in newexpr if e is not None]
 
 def shrink_all(expr):
     if microlisp_is_expression(expr):
-        res = copy.copy(expr)
+        res = list(expr)
         for i in range(1, len(res)):
             res[i] = shrink_all(res[i])
         while True:
@@ -76,48 +182,136 @@ def shrink_all(expr):
             if e == res: break
             else:
                 res = e
+            if not microlisp_is_expression(res): break
         return res
     return expr
 
-def special_sort(funcs, expr):
+def special_sort_keyed(funcs, expr):
+    """ Return (special_sort(funcs, expr), its ml_sortkey), keys are built once per node """
     if microlisp_is_expression(expr):
         if expr[0] == "and" or expr[0] == "or":
-            lst = list(map(partial(special_sort, funcs), expr[1:]))
-            lst.sort(key=ml_sortkey)
-            return [expr[0]]+lst
+            lst = [special_sort_keyed(funcs, e) for e in expr[1:]]
+            lst.sort(key=itemgetter(1))
+            return [expr[0]]+[e for e, k in lst], "0-"+expr[0]+"".join([k for e, k in lst])
         if expr[0] == "eq":
-            lst = list(map(partial(special_sort, funcs), expr[2:]))
-            lst.sort(key=ml_sortkey)
-            return [expr[0], expr[1]]+lst
-        return expr
+            lst = [special_sort_keyed(funcs, e) for e in expr[2:]]
+            lst.sort(key=itemgetter(1))
+            return [expr[0], expr[1]]+[e for e, k in lst], "0-"+expr[0]+ml_sortkey(expr[1])+"".join([k for e, k in lst])
+        return expr, ml_sortkey(expr)
     else:
+        return expr, "1-"+str(expr)
+
+def special_sort(funcs, expr):
+    if microlisp_is_expression(expr) and (expr[0] in ("and", "or", "eq")):
+        return special_sort_keyed(funcs, expr)[0]
+    return expr
+
+def special_cost(expr):
+    """ Static evaluation cost: count of expression nodes """
+    if not microlisp_is_expression(expr):
+        return 0
+    return 1 + sum(map(special_cost, expr[1:]))
+
+def special_reorder(funcs, expr, dataset=None):
+    """ Reorder arguments of `and', `or' for faster lazy evaluation
+
+    Only functions andop and orop (boolean result) are reordered, other
+    functions (like reduce-based `and' returning values) keep their order.
+
+    Arguments are sorted by cost / probability to stop evaluation there.
+    Cost is special_cost, probability is measured on `dataset' (sample list of env),
+    without dataset it is the same for all arguments.
+    Result is for evaluation only: canonical order (special_sort) is not kept
+    """
+    if not microlisp_is_expression(expr):
         return expr
+    params = [special_reorder(funcs, e, dataset) for e in expr[1:]]
+    func = funcs[expr[0]]["func"] if expr[0] in funcs else None
+    if (func is andop) or (func is orop):
+        stop = (func is orop)
+        def rank(e):
+            if not dataset:
+                return special_cost(e)
+            f = microlisp_build(funcs, e)
+            stopped = sum(1 for env in dataset if bool(f(env)) == stop)
+            if stopped == 0:
+                return float("inf")
+            return special_cost(e) * len(dataset) / stopped
+        params.sort(key=rank)
+    return [expr[0]]+params
 
-def special_optimize(funcs, expr):
+def special_simplify(funcs, expr):
+    """ Apply "simplify" rules of functions definition to top node up to fixed point
+
+    Rule: rule(expr) return simplified expression or `expr' itself
+    """
+    while microlisp_is_expression(expr) and (expr[0] in funcs):
+        for rule in funcs[expr[0]].get("simplify", ()):
+            e = rule(expr)
+            if e is not expr:
+                expr = e
+                break
+        else:
+            break
+    return expr
+
+_NOT_CACHED = object()
+
+def special_optimize(funcs, expr, cache=None):
+    """ Optimize expression up to fixed point: flatten, sort, shrink,
+    simplify by "simplify" rules of `funcs' (special_simplify)
+
+    cache: optional LRUCache (microlisp_cache) for results of one `funcs',
+    keyed by microlisp_freeze of subtree
+    Result is interned MicrolispNode for MicrolispNode `expr', list otherwise
+    """
+    if isinstance(expr, MicrolispNode):
+        return microlisp_intern(_special_optimize_cached(funcs, expr, cache))
+    return _special_optimize_cached(funcs, expr, cache)
+
+def _special_optimize_cached(funcs, expr, cache):
     if not microlisp_is_expression(expr):
         return expr
-    oldexpr = copy.deepcopy(expr)
+    if cache is not None:
+        key = microlisp_freeze(expr)
+        res = cache.get(key, _NOT_CACHED)
+        if res is not _NOT_CACHED:
+            return microlisp_thaw(res)
+        e = _special_optimize(funcs, expr, cache)
+        res = microlisp_freeze(e)
+        cache.put(key, res)
+        cache.put(res, res) # result is a fixed point
+        return e
+    return _special_optimize(funcs, expr, cache)
+
+def _special_optimize(funcs, expr, cache):
+    # steps below build new lists and never modify `expr', so it is not copied
+    oldexpr = expr
     while True:
         e = microlisp_optimize(funcs, oldexpr)
         e = special_sort(funcs, e)
         e = shrink_all(e)
+        e = special_simplify(funcs, e)
         if not microlisp_is_expression(e):
             return e
+        # adjacent equal params are dropped for variadic associative functions only
+        f = funcs.get(e[0], {})
+        dedup = f.get("associative", False) and (f.get("params_count") == -1)
         res_param = []
         param = e[1:]
         for i in range(len(param)):
-            p = special_optimize(funcs, param[i])
+            p = _special_optimize_cached(funcs, param[i], cache)
             if i==0:
                 res_param.append(p)
             else:
-                if p != res_param[-1]:
+                if not dedup or (p != res_param[-1]):
                     res_param.append(p)
         e = [e[0]]+res_param
         if e == oldexpr: break
         oldexpr = e
     return e
 
-def tree_generator(funcs, expr, elem, func_allow, func_stop):
+def tree_generator(funcs, expr, elem, func_allow, func_stop, cache=None, unique=False, skip_source=False):
     """ Expressions generator 
 
     Recursive replace subtrees and nodes of `expr' by
@@ -132,20 +326,47 @@ def tree_generator(funcs, expr, elem, func_allow, func_stop):
     
     func_stop: func_stop(expr, elem) return boolean
     Disallow or allow combinations with subnodes of `expr'
+
+    cache: optional LRUCache for special_optimize
+    unique: yield every expression once (on every level of recursion)
+    skip_source: do not yield `expr' itself (or its optimized form)
+    Expressions are interned MicrolispNode for MicrolispNode `expr', lists otherwise
     """
+    res = _tree_generator(funcs, expr, elem, func_allow, func_stop, cache, unique)
+    if skip_source:
+        source = {microlisp_freeze(expr), microlisp_freeze(special_optimize(funcs, expr, cache))}
+        res = (e for e in res if microlisp_freeze(e) not in source)
+    if isinstance(expr, MicrolispNode):
+        res = map(microlisp_intern, res)
+    return res
+
+def _tree_generator(funcs, expr, elem, func_allow, func_stop, cache, unique):
+    seen = set() if unique else None
+    def is_new(e):
+        if seen is None:
+            return True
+        key = microlisp_freeze(e)
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
     if not microlisp_is_expression(expr) and (expr == elem): return
     allow_add, allow_or = func_allow(expr, elem)
     if allow_add:
-        yield special_optimize(funcs, ["and", expr, elem])
+        e = special_optimize(funcs, ["and", expr, elem], cache)
+        if is_new(e): yield e
     if allow_or:
-        yield special_optimize(funcs, ["or", expr, elem])
+        e = special_optimize(funcs, ["or", expr, elem], cache)
+        if is_new(e): yield e
     if func_stop(expr, elem):
         return
     if microlisp_is_expression(expr):
         if len(expr) == 1:
             return
         for i in range(1, len(expr)):
-            for e in tree_generator(funcs, expr[i], elem, func_allow, func_stop):
-                ecopy = copy.deepcopy(expr)
+            for e in _tree_generator(funcs, expr[i], elem, func_allow, func_stop, cache, unique):
+                # copy only this node, other subtrees are shared with `expr'
+                ecopy = list(expr)
                 ecopy[i] = e
-                yield special_optimize(funcs, ecopy)
+                e = special_optimize(funcs, ecopy, cache)
+                if is_new(e): yield e
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+from itertools import islice
+from .microlisp import microlisp_build_many, microlisp_decode_atom
+
+""" Evaluation over datasets in files, chunk by chunk
+
+Only one chunk of rows is kept in memory:
+
+    for results in stream_eval(funcs, exprs, read_rows("data.csv")): ...
+    stats = stream_count(funcs, exprs, read_rows("data.jsonl"), target="label")
+"""
+
+def _open(source, fmt):
+    if fmt is None:
+        name = source if isinstance(source, str) else getattr(source, "name", "")
+        fmt = "csv" if name.lower().endswith(".csv") else "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("unknown rows format `%s'" % (fmt,))
+    if isinstance(source, str):
+        return open(source, "r", encoding="utf-8", newline=""), fmt, True
+    return source, fmt, False
+
+def _decode_row(row, atoms):
+    res = {}
+    for key, value in row.items():
+        # extra cells of ragged row are list under key None, missing cells are None
+        if not isinstance(value, str):
+            res[key] = value
+            continue
+        decoded = atoms.get(value, atoms)
+        if decoded is atoms:
+            decoded = atoms[value] = microlisp_decode_atom(value)
+        res[key] = decoded
+    return res
+
+def read_rows(source, fmt=None, chunk_size=10000, decode=True):
+    """ Read rows of CSV (with header) or JSON-lines file, yield lists of dict
+
+    source: file name or opened text file
+    fmt: 'csv' or 'jsonl', default by file name extension
+    chunk_size: rows per list
+    decode: CSV values are converted like atoms of code: true, false, numbers
+    """
+    fh, fmt, opened = _open(source, fmt)
+    try:
+        if fmt == "csv":
+            rows = csv.DictReader(fh)
+        else:
+            rows = (json.loads(line) for line in fh if line.strip())
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            if fmt == "csv" and decode:
+                atoms = {}
+                chunk = [_decode_row(row, atoms) for row in chunk]
+            yield chunk
+    finally:
+        if opened:
+            fh.close()
+
+def stream_eval(funcs, exprs, chunks):
+    """ Evaluate expressions on chunks of rows
+
+    Yield for every chunk list of results: one list of values per expression
+    """
+    exprs = list(exprs)
+    built = microlisp_build_many(funcs, exprs)
+    for chunk in chunks:
+        rows = [built(env) for env in chunk]
+        yield [[r[i] for r in rows] for i in range(len(exprs))]
+
+def stream_count(funcs, exprs, chunks, target=None):
+    """ Count rows where expressions are true
+
+    target: key of env or function target(env), truth of expected result
+    Return list of dict for expressions: rows, matches and,
+    with `target', confusion counts tp, fp, fn, tn
+    """
+    exprs = list(exprs)
+    built = microlisp_build_many(funcs, exprs)
+    if (target is not None) and not callable(target):
+        key = target
+        target = lambda env: env[key]
+    stats = [{"rows": 0, "matches": 0} for expr in exprs]
+    if target is not None:
+        for s in stats:
+            s.update({"tp": 0, "fp": 0, "fn": 0, "tn": 0})
+    for chunk in chunks:
+        expected = [bool(target(env)) for env in chunk] if target is not None else None
+        rows = [built(env) for env in chunk]
+        for i, s in enumerate(stats):
+            result = [bool(r[i]) for r in rows]
+            matches = sum(result)
+            s["rows"] += len(chunk)
+            s["matches"] += matches
+            if expected is not None:
+                tp = sum(1 for r, e in zip(result, expected) if r and e)
+                positive = sum(expected)
+                s["tp"] += tp
+                s["fp"] += matches - tp
+                s["fn"] += positive - tp
+                s["tn"] += len(chunk) - matches - positive + tp
+    return stats
@@ -34,6 +34,22 @@ class TestMicroLisp(unittest.TestCase):
     def test_parse_simple(self):
         self.assertEqual( microlisp_parse(microlisp_tokenize("(list)"), 'tuple'),
             ('list',))
+    def test_parse_many(self):
+        toks = microlisp_tokenize("(a b) (c (d 1)) e")
+        exprs = []
+        while toks:
+            exprs.append(microlisp_parse(toks))
+        self.assertEqual(exprs, [['a', 'b'], ['c', ['d', 1]], 'e'])
+    def test_parse_deep(self):
+        expr = microlisp_compile("(not "*5000 + "a" + ")"*5000)
+        for i in range(5000):
+            self.assertEqual(expr[0], "not")
+            expr = expr[1]
+        self.assertEqual(expr, "a")
+    def test_parse_exception_missing(self):
+        for txt in ["", "(", "(a (b c)", "((a) b)"]:
+            with self.assertRaises(SyntaxError):
+                microlisp_compile(txt)
     def test_eval1(self):
         expr = microlisp_parse( microlisp_tokenize("(and true false)") )
         self.assertEqual( microlisp_eval(STANDART_LOGIC_FUNC, {}, expr), False)
@@ -91,7 +107,7 @@ class TestMicroLisp(unittest.TestCase):
         expr = microlisp_parse( microlisp_tokenize("(sum (+ 1 2) 3 (sum 2 3 4) 4 5 6)") )
         self.assertEqual( microlisp_eval(myfuncs, {}, expr), 30)
     def test_eval12_dumps(self):
-        for txt in ["(test (test2 boo zoo) (env key1) foo (bar))", "(test a b c)"]:
+        for txt in ["(test (test2 boo zoo) (env key1) foo (bar))", "(test a b c)", "(test true false 1 1.5)"]:
             expr = microlisp_parse( microlisp_tokenize(txt) )
             self.assertEqual( microlisp_dumps(expr), txt)
     def test_eval13_sort(self):
@@ -121,6 +137,35 @@ class TestMicroLisp(unittest.TestCase):
                         res_param.append(param[i])
             e = [e[0]]+res_param
             self.assertEqual( microlisp_dumps(e), txt_res)
+    def test_freeze(self):
+        expr = microlisp_compile("(and (eq (env A) 1 true 1.0 a) (not b))")
+        key = microlisp_freeze(expr)
+        self.assertEqual(hash(key), hash(microlisp_freeze(microlisp_compile("(and (eq (env A) 1 true 1.0 a) (not b))"))))
+        self.assertNotEqual(key, microlisp_freeze(microlisp_compile("(and (eq (env A) true 1 1.0 a) (not b))")))
+        self.assertEqual(repr(microlisp_thaw(key)), repr(expr))
+    def test_build1(self):
+        myfuncs = dict(STANDART_LOGIC_FUNC)
+        myfuncs["asis"] = {"params_count": 1, "func": (lambda funeval, a: a )}
+        myfuncs["+"] = {"params_count": 2, "func": (lambda funeval, a, b: funeval(a)+funeval(b) )}
+        env = {"param": 3, "key1": "param", "falsekey": False, "C": 0}
+        for txt in ["(and true false)", "(and (or true false) (not false))", "(and (or true false) (not (env falsekey)))",
+            "(if false 1 0)", "(and 1 2 0 3)", "(or 0 false 2 3)", "(+ (+ 1 2) (env (asis param)))", "(env (env key1))",
+            "(and true (and (env C)) 1)", "(or false (or (env C)) 1)", "(and true (and (env C)))", "(or 0 (or (env param)) (env C))"]:
+            expr = microlisp_compile(txt)
+            self.assertEqual( microlisp_build(myfuncs, expr)(env), microlisp_eval(myfuncs, env, expr))
+    def test_build2_lazy(self):
+        f = microlisp_build(STANDART_LOGIC_FUNC, microlisp_compile("(if (env c) (env a) (env b))"))
+        self.assertEqual( f({"c": True, "a": 1}), 1)
+        self.assertEqual( f({"c": False, "b": 2}), 2)
+        f = microlisp_build(STANDART_LOGIC_FUNC, microlisp_compile("(and (env c) (env a))"))
+        self.assertEqual( f({"c": False}), False)
+    def test_build3_exception(self):
+        for txt in ["(and (or true false) (booz false))", "(and true (not a b))", "(or true (env a b))"]:
+            with self.assertRaises(RuntimeError):
+                microlisp_build(STANDART_LOGIC_FUNC, microlisp_compile(txt))
+        f = microlisp_build(STANDART_LOGIC_FUNC, microlisp_compile("(not (env key))"))
+        with self.assertRaisesRegex(RuntimeError, "unknown key for `env': `key'"):
+            f({})
 
 if __name__=='__main__':
 	unittest.main()
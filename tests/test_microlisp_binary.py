@@ -0,0 +1,39 @@
+import unittest
+import os
+import tempfile
+from microlisp.microlisp import microlisp_compile, microlisp_dumps
+from microlisp.microlisp_binary import MicrolispBinaryWriter, MicrolispBinaryReader, microlisp_dumpb, microlisp_loadb
+
+EXPRS = ["(or (eq (env A) a b 1) (and (env B) (not (env C))))", "(list)", "(eq (env X) 1.5 true false 12345678901234567890123)", "atom"]
+
+class TestMicroLispBinary(unittest.TestCase):
+    def test_bytes(self):
+        exprs = [microlisp_compile(txt) for txt in EXPRS] + [True, -7]
+        data = microlisp_dumpb(exprs)
+        self.assertEqual(repr(microlisp_loadb(data)), repr(exprs))
+        self.assertEqual(repr(microlisp_loadb(data, 'tuple')), repr([microlisp_compile(txt, 'tuple') for txt in EXPRS] + [True, -7]))
+        nodes = microlisp_loadb(data, 'node')
+        self.assertIs(nodes[0], microlisp_compile(EXPRS[0], 'node'))
+    def test_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with open(path, "wb") as fh:
+                with MicrolispBinaryWriter(fh) as writer:
+                    for i in range(100):
+                        writer.write(microlisp_compile("(eq (env A%d) v%d %d)" % (i % 7, i, i)))
+            with MicrolispBinaryReader(path) as reader:
+                self.assertEqual(len(reader), 100)
+                self.assertEqual(microlisp_dumps(reader[42]), "(eq (env A0) v42 42)")
+                self.assertEqual(microlisp_dumps(reader[-1]), "(eq (env A1) v99 99)")
+        finally:
+            os.remove(path)
+    def test_deep(self):
+        expr = microlisp_compile("(not "*3000 + "a" + ")"*3000)
+        self.assertEqual(microlisp_dumpb(microlisp_loadb(microlisp_dumpb([expr]))), microlisp_dumpb([expr]))
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            microlisp_loadb(b"(and a b)")
+
+if __name__=='__main__':
+	unittest.main()
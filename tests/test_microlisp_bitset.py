@@ -0,0 +1,30 @@
+import unittest
+from microlisp.microlisp_bitset import MicrolispIndex, bits_from_list, bits_from_positions, bits_to_list, bits_count
+
+DATASET = [{"A": "a", "B": 1}, {"A": "b", "B": 2}, {"A": "a", "B": True}, {"A": "c", "B": [1]}]
+
+class TestMicroLispBitset(unittest.TestCase):
+    def test_bits(self):
+        values = [True, False, 0, 1, "x", "", True]
+        bits = bits_from_list(values)
+        self.assertEqual(bits_to_list(bits, len(values)), [bool(v) for v in values])
+        self.assertEqual(bits, bits_from_positions([0, 3, 4, 6], len(values)))
+        self.assertEqual(bits_count(bits), 4)
+        self.assertEqual(bits_to_list(0, 3), [False, False, False])
+    def test_index(self):
+        index = MicrolispIndex(DATASET)
+        self.assertEqual(index.eq("A", ("a",)), 0b0101)
+        self.assertEqual(index.eq("A", ("b", "c", "d")), 0b1010)
+        self.assertEqual(index.eq("A", ()), 0)
+        self.assertIsNone(index.eq("B", (1,))) # [1] is not hashable
+        with self.assertRaises(RuntimeError):
+            index.eq("C", ("a",))
+    def test_index_lazy(self):
+        index = MicrolispIndex([{"U": i} for i in range(1000)])
+        self.assertEqual(index.eq("U", (3, 5, 1000)), 0b101000)
+        self.assertEqual(index.eq("U", (3,)), 0b1000)
+        # bitsets are built only for queried values
+        self.assertEqual(len(index._bits), 2)
+
+if __name__=='__main__':
+	unittest.main()
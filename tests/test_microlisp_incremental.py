@@ -0,0 +1,46 @@
+import unittest
+from microlisp.microlisp import microlisp_compile, microlisp_eval, microlisp_is_expression
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, tree_generator
+from microlisp.microlisp_incremental import IncrementalEvaluator
+from microlisp.microlisp_bitset import bits_to_list
+
+DATASET = [{"A": a, "B": b, "C": c} for a in "abc" for b in range(3) for c in (True, False)]
+
+def stop(tree, e):
+    return microlisp_is_expression(tree) and tree[0] in ("eq", "env", "not")
+
+class TestMicroLispIncremental(unittest.TestCase):
+    def test_evaluate(self):
+        ev = IncrementalEvaluator(SPECIAL_LISP_FUNC, DATASET)
+        expr = microlisp_compile("(or (and (eq (env A) a b) (env C)) (not (eq (env B) 1 2)) (if (env C) (eq (env A) c) false))")
+        elem = microlisp_compile("(eq (env B) 0)")
+        for e in [expr] + list(tree_generator(SPECIAL_LISP_FUNC, expr, elem, lambda tree, e: (True, True), stop)):
+            expect = [bool(microlisp_eval(SPECIAL_LISP_FUNC, env, e)) for env in DATASET]
+            self.assertEqual( bits_to_list(ev.evaluate(e), len(DATASET)), expect)
+            self.assertEqual( ev.count(e), sum(expect))
+        self.assertEqual( ev.values(microlisp_compile("(env B)")), [env["B"] for env in DATASET])
+    def test_incremental(self):
+        ev = IncrementalEvaluator(SPECIAL_LISP_FUNC, DATASET)
+        ev.evaluate(microlisp_compile("(or (and (eq (env A) a b) (env C)) (eq (env B) 1 2))"))
+        misses = ev.cache.misses
+        ev.evaluate(microlisp_compile("(or (and (eq (env A) a b) (env C) (eq (env B) 0)) (eq (env B) 1 2))"))
+        # new nodes: root, changed `and', (eq (env B) 0); (env B) is cached
+        self.assertEqual(ev.cache.misses - misses, 3)
+    def test_int_atoms(self):
+        ev = IncrementalEvaluator(SPECIAL_LISP_FUNC, DATASET)
+        for txt in ["(and (env C) 2)", "(or 0 (env C))", "(not 1)", "(eq 1 (env B))", "(eq (env B) (if (env C) 1 2))"]:
+            expr = microlisp_compile(txt)
+            expect = [bool(microlisp_eval(SPECIAL_LISP_FUNC, env, expr)) for env in DATASET]
+            self.assertEqual( bits_to_list(ev.evaluate(expr), len(DATASET)), expect)
+        expr = microlisp_compile("(if (env C) 1 0)")
+        self.assertEqual( ev.values(expr), [microlisp_eval(SPECIAL_LISP_FUNC, env, expr) for env in DATASET])
+        self.assertEqual( ev.values(microlisp_compile("(if (env C) (eq (env B) 1) 2)"))[:4], [False, 2, True, 2])
+    def test_custom_func(self):
+        funcs = dict(SPECIAL_LISP_FUNC)
+        funcs["odd"] = {"params_count": 1, "func": (lambda funeval, a: funeval(a) % 2 == 1)}
+        ev = IncrementalEvaluator(funcs, DATASET)
+        expr = microlisp_compile("(and (odd (env B)) (env C))")
+        self.assertEqual( bits_to_list(ev.evaluate(expr), len(DATASET)), [bool(microlisp_eval(funcs, env, expr)) for env in DATASET])
+
+if __name__=='__main__':
+	unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import copy
+import pickle
+from microlisp.microlisp import microlisp_compile, microlisp_dumps, microlisp_eval, microlisp_build, microlisp_sort, microlisp_is_expression
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, special_optimize, shrink_all, tree_generator
+from microlisp.microlisp_node import MicrolispNode, microlisp_node, microlisp_intern
+
+class TestMicroLispNode(unittest.TestCase):
+    def test_roundtrip(self):
+        for txt in ["(test (test2 boo zoo) (env key1) foo (bar))", "(eq (env A) 1 1.5 a)", "(list)"]:
+            expr = microlisp_compile(txt, 'node')
+            self.assertIsInstance(expr, MicrolispNode)
+            self.assertEqual( microlisp_dumps(expr), txt)
+    def test_sharing(self):
+        e1 = microlisp_compile("(and (eq (env A) a b) (or c (eq (env A) a b)))", 'node')
+        e2 = microlisp_intern(microlisp_compile("(and (eq (env A) a b) (or c (eq (env A) a b)))"))
+        self.assertIs(e1, e2)
+        self.assertIs(e1[1], e1[2][2])
+        self.assertEqual(len({e1, e2, e1[1]}), 2)
+        self.assertIs(copy.deepcopy(e1), e1)
+        self.assertIs(pickle.loads(pickle.dumps(e1)), e1)
+    def test_typed_atoms(self):
+        self.assertIsNot(microlisp_node("eq", "a", True), microlisp_node("eq", "a", 1))
+        self.assertNotEqual(microlisp_node("eq", "a", 1), microlisp_node("eq", "a", 1.0))
+        self.assertEqual(microlisp_dumps(microlisp_node("eq", "a", 1.0)), "(eq a 1.0)")
+    def test_eval(self):
+        expr = microlisp_compile("(and (eq (env A) a b) (not (env B)))", 'node')
+        env = {"A": "b", "B": False}
+        self.assertEqual( microlisp_eval(SPECIAL_LISP_FUNC, env, expr), True)
+        self.assertEqual( microlisp_build(SPECIAL_LISP_FUNC, expr)(env), True)
+        self.assertEqual( microlisp_dumps(special_optimize(SPECIAL_LISP_FUNC, expr)), "(and (eq (env A) a b) (not (env B)))")
+    def test_optimize(self):
+        txt = "(or (eq (env A) b) (and c (or (eq (env A) a) d)) (eq (env A) a))"
+        expr, lexpr = microlisp_compile(txt, 'node'), microlisp_compile(txt)
+        self.assertEqual( shrink_all(expr), shrink_all(lexpr))
+        e = special_optimize(SPECIAL_LISP_FUNC, expr)
+        self.assertIs(e, microlisp_intern(special_optimize(SPECIAL_LISP_FUNC, lexpr)))
+        e = microlisp_sort(SPECIAL_LISP_FUNC, expr)
+        self.assertIs(e, microlisp_intern(microlisp_sort(SPECIAL_LISP_FUNC, lexpr)))
+        stop = lambda tree, e: microlisp_is_expression(tree) and tree[0] in ("eq", "env")
+        elem = microlisp_compile("(eq (env B) x)")
+        res = list(tree_generator(SPECIAL_LISP_FUNC, expr, elem, lambda tree, e: (True, True), stop))
+        self.assertTrue(all(isinstance(e, MicrolispNode) for e in res))
+        self.assertEqual(res, [microlisp_intern(e) for e in tree_generator(SPECIAL_LISP_FUNC, lexpr, elem, lambda tree, e: (True, True), stop)])
+
+if __name__=='__main__':
+	unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from microlisp.microlisp import microlisp_compile, microlisp_eval
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC
+try:
+    import numpy as np
+    from microlisp.microlisp_numpy import VECTOR_LISP_FUNC, microlisp_vector_eval
+except ImportError:
+    np = None
+
+ROWS = [{"A": "a", "B": 1, "C": True}, {"A": "b", "B": 2, "C": False},
+    {"A": "c", "B": 3, "C": True}, {"A": "", "B": 0, "C": False}]
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestMicroLispNumpy(unittest.TestCase):
+    def check(self, columns, txt):
+        expr = microlisp_compile(txt)
+        expect = [microlisp_eval(SPECIAL_LISP_FUNC, row, expr) for row in ROWS]
+        self.assertEqual( microlisp_vector_eval(VECTOR_LISP_FUNC, columns, expr).tolist(), expect)
+    def test_dict(self):
+        columns = {k: [row[k] for row in ROWS] for k in ROWS[0]}
+        for txt in ["(eq (env A) a c)", "(eq (env B) 2)", "(eq (env B) 1 b 3)", "(eq (env A) x 1)", "(eq (env A) (env A))",
+            "(and (env C) (eq (env B) 1 2))", "(or (not (env C)) (eq (env A) c))", "(or (env A) false)",
+            "(if (env C) (eq (env A) a) (eq (env B) 2))", "(and true false)", "(not (env B))",
+            "(if (env C) a (eq (env C) b))", "(not (if (env C) a (eq (env C) b)))", "(if (env C) (env A) (env B))",
+            "(and (if (env C) (env B) (env A)) (env C))", "(if (env C) 1 x)"]:
+            self.check(columns, txt)
+    def test_structured(self):
+        columns = np.array([(row["A"], row["B"], row["C"]) for row in ROWS], dtype=[("A", "U4"), ("B", int), ("C", bool)])
+        for txt in ["(eq (env A) a c)", "(and (env C) (eq (env B) 1 2 3))", "(or true (env C))"]:
+            self.check(columns, txt)
+
+if __name__=='__main__':
+	unittest.main()
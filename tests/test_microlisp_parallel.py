@@ -0,0 +1,35 @@
+import unittest
+from microlisp.microlisp import microlisp_compile, microlisp_dumps, microlisp_is_expression
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, tree_generator
+from microlisp.microlisp_parallel import parallel_score, score_count
+
+DATASET = [{"A": a, "B": b} for a in "abc" for b in range(4)]
+
+class TestMicroLispParallel(unittest.TestCase):
+    def test_score(self):
+        expr = microlisp_compile("(or (eq (env A) a) (eq (env B) 1 2))")
+        elem = microlisp_compile("(eq (env B) 3)")
+        candidates = list(tree_generator(SPECIAL_LISP_FUNC, expr, elem, lambda tree, e: (True, True), lambda tree, e: microlisp_is_expression(tree) and tree[0] == "eq"))
+        expect = [(microlisp_dumps(e), score_count(SPECIAL_LISP_FUNC, DATASET, e)) for e in candidates]
+        result = [(microlisp_dumps(e), s) for e, s in parallel_score(SPECIAL_LISP_FUNC, iter(candidates), DATASET, workers=2, chunk_size=2)]
+        self.assertEqual(result, expect)
+        result = [(microlisp_dumps(e), s) for e, s in parallel_score(SPECIAL_LISP_FUNC, candidates, DATASET, workers=2, chunk_size=3, ordered=False)]
+        self.assertEqual(sorted(result), sorted(expect))
+    def test_lazy(self):
+        consumed = [0]
+        def candidates():
+            for b in range(2000):
+                consumed[0] += 1
+                yield ["eq", ["env", "B"], b]
+        for ordered in (True, False):
+            consumed[0] = 0
+            result = parallel_score(SPECIAL_LISP_FUNC, candidates(), DATASET, workers=2, chunk_size=10, ordered=ordered)
+            first = next(result)
+            # at most workers * 2 chunks are taken before first result
+            self.assertLessEqual(consumed[0], 40)
+            rest = list(result)
+            self.assertEqual(len(rest) + 1, 2000)
+            self.assertEqual(first[1] + sum(s for e, s in rest), len(DATASET))
+
+if __name__=='__main__':
+	unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from microlisp.microlisp import microlisp_compile, microlisp_eval, microlisp_build, STANDART_LOGIC_FUNC
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC
+from microlisp.microlisp_profile import MicrolispProfile, profile_funcs, profile_env
+
+class TestMicroLispProfile(unittest.TestCase):
+    def test_profile(self):
+        profile = MicrolispProfile()
+        pfuncs = profile_funcs(SPECIAL_LISP_FUNC, profile)
+        expr = microlisp_compile("(and (eq (env A) a) (or (env B) (eq (env C) c)))")
+        dataset = [{"A": "a", "B": True, "C": "c"}, {"A": "b", "B": True, "C": "c"},
+            {"A": "a", "B": False, "C": "c"}, {"A": "a", "B": False, "C": "x"}]
+        for env in dataset:
+            self.assertEqual( microlisp_eval(pfuncs, profile_env(env, profile), expr), microlisp_eval(SPECIAL_LISP_FUNC, env, expr))
+        self.assertEqual(profile.calls["and"], 4)
+        self.assertEqual(profile.calls["eq"], 6)
+        self.assertEqual(profile.calls["or"], 3)
+        self.assertEqual(profile.calls["env"], 9)
+        self.assertEqual(profile.shortcircuit["and"], [1, 1])
+        self.assertEqual(profile.evaluated["and"], [4, 3])
+        self.assertEqual(profile.shortcircuit["or"], [1, 1])
+        self.assertIn("and", profile.report())
+        f = microlisp_build(pfuncs, expr)
+        f(profile_env(dataset[0], profile))
+        self.assertEqual(profile.calls["and"], 5)
+        self.assertEqual(SPECIAL_LISP_FUNC["and"]["func"].__name__, "andop")
+    def test_shortcircuit_funcs(self):
+        expr = microlisp_compile("(and false true true)")
+        profile = MicrolispProfile()
+        microlisp_eval(profile_funcs(SPECIAL_LISP_FUNC, profile), {}, expr)
+        self.assertEqual(profile.evaluated["and"], [1])
+        self.assertEqual(profile.shortcircuit["and"], [1])
+        # reduce-based `and' evaluates intermediate results too, positions are not recorded
+        profile = MicrolispProfile()
+        microlisp_eval(profile_funcs(STANDART_LOGIC_FUNC, profile), {}, expr)
+        self.assertEqual(profile.calls["and"], 1)
+        self.assertNotIn("and", profile.evaluated)
+        self.assertNotIn("and", profile.shortcircuit)
+
+if __name__=='__main__':
+	unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import asyncio
+import threading
+import time
+from microlisp.microlisp import microlisp_compile, microlisp_eval
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC, special_optimize
+from microlisp.microlisp_service import MicrolispService
+
+RULES = ["(or (eq (env A) a b) (env C))", "(and (eq (env A) a) (not (env C)))", "(eq (env B) 1 2)"]
+DATASET = [{"A": a, "B": b, "C": c} for a in "abc" for b in range(3) for c in (True, False)]
+
+def expect(source, env):
+    return microlisp_eval(SPECIAL_LISP_FUNC, env, microlisp_compile(source))
+
+class TestMicroLispService(unittest.TestCase):
+    def test_evaluate(self):
+        service = MicrolispService(SPECIAL_LISP_FUNC, special_optimize, maxsize=2)
+        for env in DATASET:
+            for source in RULES:
+                self.assertEqual(service.evaluate(source, env), expect(source, env))
+        requests = [(source, env) for env in DATASET for source in RULES]
+        self.assertEqual(service.evaluate_batch(requests), [expect(s, e) for s, e in requests])
+        metrics = service.metrics()
+        self.assertEqual(metrics["evaluations"], 2 * len(requests))
+        self.assertEqual(metrics["size"], 2)
+        self.assertGreater(metrics["evictions"], 0)
+        with self.assertRaises(RuntimeError):
+            service.evaluate("(eq (env D) 1)", {})
+        self.assertEqual(service.metrics()["errors"], 1)
+    def test_threads(self):
+        service = MicrolispService(SPECIAL_LISP_FUNC)
+        failures = []
+        def client():
+            for env in DATASET:
+                for source in RULES:
+                    if service.evaluate(source, env) != expect(source, env):
+                        failures.append((source, env))
+        threads = [threading.Thread(target=client) for i in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(service.metrics()["misses"], len(RULES))
+    def test_single_compile(self):
+        calls = []
+        def slow_optimize(funcs, expr):
+            calls.append(expr)
+            time.sleep(0.05)
+            return expr
+        service = MicrolispService(SPECIAL_LISP_FUNC, optimize=slow_optimize)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.evaluate(RULES[0], DATASET[0]))) for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(results, [expect(RULES[0], DATASET[0])] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(service.metrics()["misses"], 1)
+    def test_async(self):
+        service = MicrolispService(SPECIAL_LISP_FUNC)
+        requests = [(source, env) for env in DATASET for source in RULES]
+        async def run():
+            return await asyncio.gather(*[service.aevaluate(s, e) for s, e in requests], service.aevaluate("(bad", {}), return_exceptions=True)
+        results = asyncio.run(run())
+        self.assertEqual(results[:-1], [expect(s, e) for s, e in requests])
+        self.assertIsInstance(results[-1], SyntaxError)
+        metrics = service.metrics()
+        self.assertEqual(metrics["batches"], 1)
+        self.assertEqual(metrics["errors"], 1)
+
+if __name__=='__main__':
+	unittest.main()
@@ -1,6 +1,17 @@
 import unittest
-from microlisp.microlisp import microlisp_compile, microlisp_dumps, microlisp_optimize, microlisp_is_expression
-from microlisp.microlisp_special import tree_generator, shrink_all, SPECIAL_LISP_FUNC, special_optimize
+from microlisp.microlisp import microlisp_compile, microlisp_dumps, microlisp_optimize, microlisp_is_expression, microlisp_eval, microlisp_build, microlisp_build_many
+from microlisp.microlisp_special import tree_generator, shrink_all, SPECIAL_LISP_FUNC, special_optimize, special_sort, special_reorder, simplify_if, simplify_not, special_sort_keyed
+from microlisp.microlisp import ml_sortkey, STANDART_LOGIC_FUNC
+from microlisp.microlisp_cache import LRUCache
+
+def sort_by_sortkey(expr):
+    """ special_sort by ml_sortkey of every node """
+    if microlisp_is_expression(expr):
+        if expr[0] == "and" or expr[0] == "or":
+            return [expr[0]]+sorted(map(sort_by_sortkey, expr[1:]), key=ml_sortkey)
+        if expr[0] == "eq":
+            return [expr[0], expr[1]]+sorted(map(sort_by_sortkey, expr[2:]), key=ml_sortkey)
+    return expr
 
 def func_stop_test(expr, elem):
     if microlisp_is_expression(expr):
@@ -19,6 +30,39 @@ class TestMicroLispSpecial(unittest.TestCase):
             expr = microlisp_compile( txt_src ) # sort + shrink
             e = special_optimize(SPECIAL_LISP_FUNC, expr)
             self.assertEqual( microlisp_dumps(e), txt_res)
+    def test_shrink_wide(self):
+        expr = ["or"] + [["eq", ["env", "A%d" % (i % 3)], "v%d" % i, "v%d" % (i + 3)] for i in range(9)] + ["E"]
+        self.assertEqual( microlisp_dumps(shrink_all(expr)),
+            "(or (eq (env A0) v0 v3 v6 v9) (eq (env A1) v1 v4 v7 v10) (eq (env A2) v2 v5 v8 v11) E)")
+    def test_simplify(self):
+        for txt_src, txt_res in [("(or a (and a b))", "a"), ("(and a (or b a) c)", "(and a c)"),
+            ("(and a (not a))", "false"), ("(or (not (eq A a)) b (eq A a))", "true"),
+            ("(and true a (not (not b)))", "(and a b)"), ("(or false (and true false) c)", "c"),
+            ("(if true a b)", "a"), ("(if (not true) a b)", "b"), ("(and (or a (not a)) c)", "c"),
+            ("(or (and a b) (and a c))", "(or (and a b) (and a c))"),
+            ("(or (and x (not x)) (and y (not y)))", "false"), ("(and (or x (not x)) (or y (not y)))", "true"),
+            ("(f1 (or (and a (not a)) (and b (not b))) c)", "(f1 false c)"),
+            ]:
+            e = special_optimize(SPECIAL_LISP_FUNC, microlisp_compile(txt_src))
+            self.assertEqual( microlisp_dumps(e), txt_res)
+    def test_sort_keyed(self):
+        for txt in ["(or (and (eq (env B) b a) (eq (env A) c 2 10)) (env C) (and (or z y) (eq (env A) (env B) a)))",
+            "(and (or (eq (env A) b) (eq (env A) a)) (or (eq (env A) a b) c) (not (or b a)) (eq (env C) (and y x) 1.5 true))",
+            "(eq (or b a) (eq (env A) b a) (and (or d c) b) a)", "(or (and b a) (and a b) (and (or a b)) (and) a 10 9)"]:
+            expr = microlisp_compile(txt)
+            e, key = special_sort_keyed(SPECIAL_LISP_FUNC, expr)
+            self.assertEqual(e, sort_by_sortkey(expr))
+            self.assertEqual(key, ml_sortkey(e))
+    def test_simplify_if(self):
+        env = {"C": 0}
+        for txt_src, txt_res in [("(if (not false) (not false) (env C))", "true"), ("(if (env C) true true)", "(if (env C) true true)"),
+            ("(eq (env C) a a)", "(eq (env C) a a)"), ("(and (env C) (env C))", "(env C)")]:
+            expr = microlisp_compile(txt_src)
+            e = special_optimize(SPECIAL_LISP_FUNC, expr)
+            self.assertEqual( microlisp_dumps(e), txt_res)
+            self.assertEqual( bool(microlisp_eval(SPECIAL_LISP_FUNC, env, microlisp_compile(microlisp_dumps(e)))), bool(microlisp_eval(SPECIAL_LISP_FUNC, env, expr)))
+        self.assertEqual( simplify_if(["if", True, "a"]), ["if", True, "a"])
+        self.assertEqual( simplify_not(["not", True, "a"]), ["not", True, "a"])
     def test_addtotree1(self):
         addit = "a"
         code = "(f1 a b c)"
@@ -43,8 +87,7 @@ class TestMicroLispSpecial(unittest.TestCase):
             "(f1 a (f2 (or a d) b) c)", #`a' in depth (or a d), so after optimization we can get source expression
             "(f1 a (or (f2 (or a d) b) a) c)",
             "(f1 a (and (f2 (or a d) b) a) c)",
-            "(f1 a (f2 (and (or a d) a) b) c)",
-            "(f1 a (f2 (or (and a d) a) b) c)",
+            "(f1 a (f2 a b) c)", #absorption: (and (or a d) a) and (or (and a d) a) are `a'
             "(f1 a (f2 (or a d) (and a b)) c)",
             "(f1 a (f2 (or a d) (or a b)) c)",
             "(f1 a (f2 (or a d) b) (and a c))",
@@ -56,6 +99,85 @@ class TestMicroLispSpecial(unittest.TestCase):
             self.assertIn(e, result)
         for e in result:
             self.assertIn(e, expect)
+    def test_addtotree_unique(self):
+        code = "(f1 a (f2 (or a d) b) c)"
+        full = [microlisp_dumps(e) for e in tree_generator(SPECIAL_LISP_FUNC, microlisp_compile(code), "a", lambda tree, e: (True, True), lambda tree, e: False)]
+        result = [microlisp_dumps(e) for e in tree_generator(SPECIAL_LISP_FUNC, microlisp_compile(code), "a", lambda tree, e: (True, True), lambda tree, e: False,
+            unique=True, skip_source=True)]
+        self.assertEqual(len(result), len(set(result)))
+        self.assertNotIn(code, result)
+        self.assertEqual(set(result), set(full) - {code})
+    def test_optimize_cache(self):
+        cache = LRUCache(100)
+        code = "(f1 a (f2 (or a d) b) c)"
+        expect = [microlisp_dumps(e) for e in tree_generator(SPECIAL_LISP_FUNC, microlisp_compile(code), "a", lambda tree, e: (True, True), lambda tree, e: False)]
+        for i in range(2):
+            result = [microlisp_dumps(e) for e in tree_generator(SPECIAL_LISP_FUNC, microlisp_compile(code), "a", lambda tree, e: (True, True), lambda tree, e: False, cache)]
+            self.assertEqual(result, expect)
+        stats = cache.stats()
+        self.assertGreater(stats["hits"], 0)
+        self.assertLessEqual(stats["size"], 100)
+        e = special_optimize(SPECIAL_LISP_FUNC, microlisp_compile("(or (eq A a b c) (eq A b c d) E)"), cache)
+        e.append("x") # result is not shared with cache
+        self.assertEqual(microlisp_dumps(special_optimize(SPECIAL_LISP_FUNC, microlisp_compile("(or (eq A a b c) (eq A b c d) E)"), cache)), "(or (eq A a b c d) E)")
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2})
+    def test_reorder(self):
+        expr = special_sort(SPECIAL_LISP_FUNC, microlisp_compile("(or (and (eq (env A) a) (eq (env B) b)) (env C))"))
+        self.assertEqual( microlisp_dumps(special_reorder(SPECIAL_LISP_FUNC, expr)), "(or (env C) (and (eq (env A) a) (eq (env B) b)))")
+        self.assertEqual( microlisp_dumps(expr), "(or (and (eq (env A) a) (eq (env B) b)) (env C))")
+        dataset = [{"A": "a", "B": b, "C": False} for b in "abcd"]
+        self.assertEqual( microlisp_dumps(special_reorder(SPECIAL_LISP_FUNC, expr, dataset)),
+            "(or (and (eq (env B) b) (eq (env A) a)) (env C))")
+        for env in dataset:
+            self.assertEqual( microlisp_eval(SPECIAL_LISP_FUNC, env, special_reorder(SPECIAL_LISP_FUNC, expr, dataset)),
+                microlisp_eval(SPECIAL_LISP_FUNC, env, expr))
+        # value-returning `and', `or' and tables without them are not reordered
+        expr = microlisp_compile("(or (and (env A) (env B)) (env C))")
+        self.assertEqual( special_reorder(STANDART_LOGIC_FUNC, expr), expr)
+        self.assertEqual( special_reorder({"not": SPECIAL_LISP_FUNC["not"]}, expr), expr)
+    def test_build_cse(self):
+        class CountEnv(dict):
+            count = 0
+            def __getitem__(self, key):
+                CountEnv.count += 1
+                return dict.__getitem__(self, key)
+        expr = microlisp_compile("(or (and (eq (env A) a b) (env C)) (and (eq (env A) a b) (not (env C))) (eq (env A) c))")
+        f = microlisp_build(SPECIAL_LISP_FUNC, expr, cse=True)
+        for a in "abcd":
+            for c in (True, False):
+                env = CountEnv({"A": a, "C": c})
+                self.assertEqual( f(env), microlisp_eval(SPECIAL_LISP_FUNC, env, expr))
+        CountEnv.count = 0
+        self.assertEqual( f(CountEnv({"A": "c", "C": True})), True)
+        self.assertEqual(CountEnv.count, 1) # (env A) once, (env C) is not needed
+        CountEnv.count = 0
+        self.assertEqual( f(CountEnv({"A": "a", "C": True})), True) # lazy `or': later branches are skipped
+        self.assertEqual(CountEnv.count, 2)
+    def test_build_many(self):
+        code = "(or (and (eq (env A) a b) (env C)) (eq (env B) 1 2))"
+        elem = microlisp_compile("(eq (env C) true)")
+        exprs = list(tree_generator(SPECIAL_LISP_FUNC, microlisp_compile(code), elem, lambda tree, e: (True, True),
+            lambda tree, e: func_stop_test(tree, e) or (microlisp_is_expression(tree) and tree[0] == "env")))
+        f = microlisp_build_many(SPECIAL_LISP_FUNC, exprs)
+        for a in "abc":
+            for b in (1, 3):
+                for c in (True, False):
+                    env = {"A": a, "B": b, "C": c}
+                    self.assertEqual( f(env), [microlisp_eval(SPECIAL_LISP_FUNC, env, e) for e in exprs])
+    def test_build(self):
+        env = {"A": "a", "B": 2, "C": True}
+        for txt in ["(eq (env A) b a)", "(eq (env A) b c)", "(eq (env B) (env B))", "(eq (env A) b (env A))",
+            "(and (eq (env B) 1 2) (or (env C) (eq (env A) c)))", "(or false (not (env C)))", "(if (env C) (env A) 0)"]:
+            expr = microlisp_compile(txt)
+            self.assertEqual( microlisp_build(SPECIAL_LISP_FUNC, expr)(env), microlisp_eval(SPECIAL_LISP_FUNC, env, expr))
 
 if __name__=='__main__':
 	unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import io
+from microlisp.microlisp import microlisp_compile, microlisp_eval
+from microlisp.microlisp_special import SPECIAL_LISP_FUNC
+from microlisp.microlisp_stream import read_rows, stream_eval, stream_count
+
+CSV = "A,B,label\na,1,true\nb,2,false\nc,1,true\na,3,false\nb,1,false\n"
+JSONL = '{"A": "a", "B": 1, "label": true}\n{"A": "b", "B": 2, "label": false}\n\n{"A": "c", "B": 1, "label": true}\n'
+
+class TestMicroLispStream(unittest.TestCase):
+    def test_read(self):
+        chunks = list(read_rows(io.StringIO(CSV), "csv", chunk_size=2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0][0], {"A": "a", "B": 1, "label": True})
+        chunks = list(read_rows(io.StringIO(JSONL), "jsonl", chunk_size=2))
+        self.assertEqual([len(c) for c in chunks], [2, 1])
+        self.assertEqual(chunks[1][0], {"A": "c", "B": 1, "label": True})
+    def test_read_ragged(self):
+        rows = list(read_rows(io.StringIO("A,B\na,1,extra,2\nb\n"), "csv"))[0]
+        self.assertEqual(rows[0], {"A": "a", "B": 1, None: ["extra", "2"]})
+        self.assertEqual(rows[1], {"A": "b", "B": None})
+    def test_eval(self):
+        exprs = [microlisp_compile("(eq (env B) 1)"), microlisp_compile("(or (eq (env A) a) (eq (env B) 2))")]
+        rows = [row for chunk in read_rows(io.StringIO(CSV), "csv") for row in chunk]
+        result = [[], []]
+        for chunk_result in stream_eval(SPECIAL_LISP_FUNC, exprs, read_rows(io.StringIO(CSV), "csv", chunk_size=2)):
+            for r, c in zip(result, chunk_result):
+                r.extend(c)
+        self.assertEqual(result, [[microlisp_eval(SPECIAL_LISP_FUNC, row, e) for row in rows] for e in exprs])
+        stats = stream_count(SPECIAL_LISP_FUNC, exprs, read_rows(io.StringIO(CSV), "csv", chunk_size=2), target="label")
+        self.assertEqual(stats[0], {"rows": 5, "matches": 3, "tp": 2, "fp": 1, "fn": 0, "tn": 2})
+        self.assertEqual(stats[1], {"rows": 5, "matches": 3, "tp": 1, "fp": 2, "fn": 1, "tn": 1})
+
+if __name__=='__main__':
+	unittest.main()